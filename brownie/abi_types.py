@@ -0,0 +1,136 @@
+from collections import namedtuple
+from functools import lru_cache
+from eth_abi.decoding import TupleDecoder, ContextFramesBytesIO
+from eth_abi.registry import registry
+
+# Parser for canonical ABI types and function signatures, and a cache of
+# compiled decoders keyed by signature. Handles any nesting of tuples and
+# arrays, e.g. "upgrade((address,(uint8,bytes)[])[],uint256)".
+
+# kind is 'base', 'tuple' or 'array'. Arrays keep their element type in
+# `components[0]` and their length (None if dynamic) in `length`.
+ABIType = namedtuple('ABIType', ['kind', 'canonical', 'components', 'length'])
+
+TYPE_ALIASES = {
+    'uint': 'uint256',
+    'int': 'int256',
+    'ufixed': 'ufixed128x18',
+    'fixed': 'fixed128x18',
+    'byte': 'bytes1',
+}
+
+# Split "a,(b,c),d[]" on top level commas only
+def split_types(types):
+    parts = []
+    depth = 0
+    current = ''
+    for char in types:
+        if char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        current += char
+    if current != '':
+        parts.append(current)
+    return parts
+
+def is_dynamic(abi_type):
+    if abi_type in ('bytes', 'string') or abi_type.endswith('[]'):
+        return True
+    if abi_type.endswith(']'):
+        return is_dynamic(abi_type[:abi_type.rindex('[')])
+    if abi_type.startswith('('):
+        return any([is_dynamic(t) for t in split_types(abi_type[1:-1])])
+    return False
+
+# Type string of an ABI json input, tuples expanded from their components
+def abi_input_type(abi_input):
+    if abi_input['type'].startswith('tuple'):
+        components = ",".join([abi_input_type(c) for c in abi_input['components']])
+        return "({}){}".format(components, abi_input['type'][len('tuple'):])
+    return abi_input['type']
+
+# "(address srcToken,uint256 amount) desc" -> "(address,uint256)"
+def strip_names(argument):
+    argument = argument.strip()
+    if argument.startswith('('):
+        end = argument.rindex(')')
+        components = [strip_names(c) for c in split_types(argument[1:end])]
+        return "({}){}".format(",".join(components), argument[end + 1:].split(' ')[0])
+    return argument.split(' ')[0]
+
+@lru_cache(maxsize=None)
+def parse_type(abi_type):
+    abi_type = strip_names(abi_type)
+    if abi_type.endswith(']'):
+        start = abi_type.rindex('[')
+        element = parse_type(abi_type[:start])
+        length = abi_type[start + 1:-1]
+        return ABIType(
+            'array',
+            "{}[{}]".format(element.canonical, length),
+            [element],
+            int(length) if length else None,
+        )
+    if abi_type.startswith('('):
+        if not abi_type.endswith(')'):
+            raise Exception("Malformed tuple type {}".format(abi_type))
+        components = [parse_type(t) for t in split_types(abi_type[1:-1])]
+        return ABIType('tuple', "({})".format(",".join([c.canonical for c in components])), components, None)
+    if abi_type == '':
+        raise Exception("Empty ABI type")
+    return ABIType('base', TYPE_ALIASES.get(abi_type, abi_type), [], None)
+
+# "transfer(address to, uint amount)" -> ("transfer", [address, uint256 ABITypes])
+@lru_cache(maxsize=None)
+def parse_signature(signature):
+    signature = signature.strip()
+    if '(' not in signature or not signature.endswith(')'):
+        raise Exception("Malformed function signature {}".format(signature))
+    name = signature[:signature.index('(')]
+    args = signature[len(name) + 1:-1]
+    return name, [parse_type(t) for t in split_types(args)] if args.strip() else []
+
+def canonical_signature(signature):
+    name, types = parse_signature(signature)
+    return "{}({})".format(name, ",".join([t.canonical for t in types]))
+
+@lru_cache(maxsize=1024)
+def decoder_for(signature):
+    _, types = parse_signature(signature)
+    return TupleDecoder(decoders=[registry.get_decoder(t.canonical) for t in types])
+
+# Decode the arguments of a call to `signature`, starting `offset` bytes into
+# `data` (e.g. 4 to skip the selector). A memoryview over a whole bytes object
+# is decoded in place, without copying it
+def decode_arguments(signature, data, offset=0):
+    if isinstance(data, memoryview) and isinstance(data.obj, bytes) and data.nbytes == len(data.obj):
+        data = data.obj
+    stream = ContextFramesBytesIO(data if isinstance(data, (bytes, memoryview)) else bytes(data))
+    stream.push_frame(offset)
+    return decoder_for(signature)(stream)
+
+# Pretty lines for a decoded value. `format_address` labels addresses
+def format_value(abi_type, value, format_address=str, indent=0):
+    pad = "    " * indent
+    if abi_type.kind == 'tuple':
+        lines = [pad + "("]
+        for component, v in zip(abi_type.components, value):
+            lines += format_value(component, v, format_address, indent + 1)
+        return lines + [pad + ")"]
+    if abi_type.kind == 'array':
+        if len(value) == 0:
+            return [pad + "[]"]
+        lines = [pad + "["]
+        for v in value:
+            lines += format_value(abi_type.components[0], v, format_address, indent + 1)
+        return lines + [pad + "]"]
+    if abi_type.canonical == 'address':
+        return [pad + format_address(value)]
+    if isinstance(value, (bytes, bytearray)):
+        return [pad + '0x' + bytes(value).hex()]
+    return [pad + str(value)]
@@ -13,6 +13,7 @@ GOV_MULTISIG = '0xbe2AB3d3d8F6a32b96414ebbd865dBD276d3d899'
 ORIGINTEAM = '0x449e0b5564e0d141b3bc3829e74ffa0ea8c08ad5'
 REWARDS_SOURCE = "0x7d82E86CF1496f9485a8ea04012afeb3C7489397"
 GOVERNOR_FIVE = "0x3cdd07c16614059e66344a7b579dab4f9516c0b6"
+GOVERNOR_SIX = "0x1D3Fbd4d129Ddd2372EA85c5Fa00b2682081c9EC"
 TIMELOCK = "0x35918cDE7233F2dD33fA41ae3Cb6aE0e42E0e69F"
 
 BASE_TIMELOCK = "0xf817cb3092179083c48c014688D98B72fB61464f"
@@ -179,6 +180,11 @@ CVX_LOCKER = '0x72a19342e8F1838460eBFCCEf09F6585e32db86E'
 
 UNISWAP_V3_QUOTER = '0x61fFE014bA17989E743c5F6cB21bF9697530B21e'
 
+# Same address on all chains we operate on
+MULTICALL3 = '0xcA11bde05977b3631167028862bE2a173976CA11'
+# Safe v1.3.0 MultiSendCallOnly, same address on every chain
+MULTISEND_CALL_ONLY = '0x40A2aCCbd92BCA938b02010E17A5b8929b49130D'
+
 #
 OETH = "0x856c4efb76c1d1ae02e20ceb03a2a6a08b0b8dc3"
 OETH_ZAPPER = "0x9858e47BCbBe6fBAC040519B02d7cd4B2C470C66"
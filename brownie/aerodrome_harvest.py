@@ -7,6 +7,14 @@ AERO_WETH_TICKSPACING = 200
 
 SLIPPAGE = 1.0 # 1%
 
+# Tick spacings tried by the swap planner. Paths through pools that
+# don't exist fail to quote and are skipped.
+CANDIDATE_TICKSPACINGS = [1, 50, 100, 200, 2000]
+CANDIDATE_INTERMEDIATE_TOKENS = [USDC_BASE]
+
+# Number of steps the amount is split in when looking for the best two route split
+SPLIT_STEPS = 10
+
 def swap_params_multiple(amount_in, path, recipient=OETHB_STRATEGIST, to_token=WETH_BASE, to_token_label="WETH"):
     # Get a quote
     (amountOut, gasEstimate, ticksCrossed, sqrtPriceX96After) = aero_quoter.quoteExactInput.call(
@@ -101,6 +109,89 @@ def swap_params(amount_in, recipient=OETHB_STRATEGIST, to_token=WETH_BASE, tick_
 
     return params
     
+# All direct and one intermediate token paths from AERO to to_token, as lists of hops
+def candidate_paths(to_token=WETH_BASE, tick_spacings=CANDIDATE_TICKSPACINGS, intermediate_tokens=CANDIDATE_INTERMEDIATE_TOKENS):
+    paths = [[AERO_BASE, tick_spacing, to_token] for tick_spacing in tick_spacings]
+    for token in intermediate_tokens:
+        for first_tick_spacing in tick_spacings:
+            for second_tick_spacing in tick_spacings:
+                paths.append([AERO_BASE, first_tick_spacing, token, second_tick_spacing, to_token])
+    return paths
+
+def path_pools(path):
+    return set([tuple(path[i:i + 3]) for i in range(0, len(path) - 2, 2)])
+
+# Quote every candidate path at every split of amount_in in a single Multicall round trip
+# and pick the best route, or best split between two routes that don't share a pool.
+# Returns the router params for `aero_router.exactInput` of every leg.
+def plan_swap(amount_in, recipient=OETHB_STRATEGIST, to_token=WETH_BASE, paths=None, split_steps=SPLIT_STEPS, slippage=SLIPPAGE):
+    if paths is None:
+        paths = candidate_paths(to_token)
+
+    amounts = [int(amount_in * step / split_steps) for step in range(1, split_steps + 1)]
+    amounts[-1] = int(amount_in)
+
+    results = multicall([
+        (aero_quoter.quoteExactInput, [encode_v3_path(*path), amount])
+        for path in paths for amount in amounts
+    ], batch_size=50)
+
+    # quotes[path index][step] is the amount out when swapping `step` / split_steps of amount_in
+    quotes = {}
+    for i, path in enumerate(paths):
+        path_results = results[i * split_steps:(i + 1) * split_steps]
+        if any([result is None for result in path_results]):
+            continue
+        quotes[i] = [0] + [result[0] for result in path_results]
+
+    if len(quotes) == 0:
+        raise Exception("No route quoted for AERO > {}".format(to_token))
+
+    # (amount out, [(path index, step), ...])
+    best = max([(quotes[i][split_steps], [(i, split_steps)]) for i in quotes])
+    for i in quotes:
+        for j in quotes:
+            if j <= i or len(path_pools(paths[i]) & path_pools(paths[j])) > 0:
+                continue
+            for step in range(1, split_steps):
+                amount_out = quotes[i][step] + quotes[j][split_steps - step]
+                if amount_out > best[0]:
+                    best = (amount_out, [(i, step), (j, split_steps - step)])
+
+    print("\n--------------------")
+    print("###### AERO > {} route plan: ".format(to_token))
+    print("--------------------")
+    print("Routes quoted:                           {} of {}".format(len(quotes), len(paths)))
+    print("AERO to use:                             {:.6f}".format(scale_amount(AERO_BASE, 'human', amount_in)))
+    print("Slippage:                                {:.2f}%".format(slippage))
+    print("Total amount out:                        {:.6f}".format(scale_amount(to_token, 'human', best[0])))
+
+    legs = []
+    used = 0
+    for n, (i, step) in enumerate(best[1]):
+        # Last leg picks up the rounding dust
+        leg_amount_in = int(amount_in) - used if n == len(best[1]) - 1 else amounts[step - 1]
+        used += leg_amount_in
+        amount_out = quotes[i][step]
+        min_amount_out = int(amount_out * (100 - slippage) / 100)
+
+        print("--------- Leg {} ----------".format(n + 1))
+        print("Path:                                    {}".format(" > ".join([str(hop) for hop in paths[i]])))
+        print("AERO in:                                 {:.6f}".format(scale_amount(AERO_BASE, 'human', leg_amount_in)))
+        print("Amount out:                              {:.6f}".format(scale_amount(to_token, 'human', amount_out)))
+        print("Min expected tokens:                     {:.6f}".format(scale_amount(to_token, 'human', min_amount_out)))
+
+        legs.append([
+            encode_v3_path(*paths[i]),
+            recipient,
+            # deadline, 2 hours in the future (see `swap_params`)
+            time.time() + (2 * 60 * 60),
+            leg_amount_in, # amountIn
+            min_amount_out, # minAmountOut
+        ])
+
+    return legs
+
 def harvest_and_swap():
     txs = []
 
@@ -127,3 +218,30 @@ def harvest_and_swap():
 
     print(to_gnosis_json(txs, OETHB_STRATEGIST, "8453"))
 
+
+def harvest_and_swap_best_route():
+    txs = []
+
+    # Collect AERO from the strategy
+    txs.append(
+        amo_strat.collectRewardTokens(from_strategist)
+    )
+
+    # Figure out how AERO the strategist has
+    balance = aero.balanceOf(OETHB_STRATEGIST, from_strategist)
+
+    # Approve the swap router to move it
+    txs.append(
+        aero.approve(AERODROME_SWAP_ROUTER_BASE, balance, from_strategist)
+    )
+
+    # Do the swap, one tx per leg of the best route split
+    for params in plan_swap(balance):
+        txs.append(
+            aero_router.exactInput(
+                params,
+                from_strategist
+            )
+        )
+
+    print(to_gnosis_json(txs, OETHB_STRATEGIST, "8453"))
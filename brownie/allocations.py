@@ -1,7 +1,12 @@
 import world
+import numpy as np
 import pandas as pd
 import brownie
 import re
+import os
+import json
+import csv
+from types import SimpleNamespace
 
 NAME_TO_STRAT = {
     "CONVEX": world.convex_strat,
@@ -120,6 +125,19 @@ def to_strat(to_strat, funds):
     return world.vault_admin.depositToStrategy(to_strat, coins, amounts, {"from": world.STRATEGIST})
 
 
+# Coins the scenario engine shocks, in column order of the scenario matrices
+SCENARIO_COINS = list(CORE_STABLECOINS.keys())
+
+# Depeg scenarios behind `allocation_exposure`. Shocks are the fraction of the
+# peg lost, pool weights where the Curve pools end up.
+WORST_CASE_SCENARIOS = {
+    "DAI": [[1.0, 0.0, 0.0], [1.0, 0.0, 0.0]],
+    # DAI follows a USDC peg loss
+    "USDC": [[1.0, 1.0, 0.0], [0.0, 1.0, 0.0]],
+    "USDT": [[0.0, 0.0, 1.0], [0.0, 0.0, 1.0]],
+}
+
+
 def allocation_exposure(allocation):
     """
     Shows how exposed we would be to a stablecoin peg loss.
@@ -130,16 +148,95 @@ def allocation_exposure(allocation):
 
     Reality may not be quite so bad.
     """
-    exposure_masks = {
-        "DAI": (allocation["token"] == "DAI") | (allocation["token"] == "*"),
-        "USDC": (allocation["token"] == "USDC") | (allocation["token"] == "DAI") | (allocation["token"] == "*"),
-        "USDT": (allocation["token"] == "USDT") | (allocation["token"] == "*"),
-    }
+    shocks = np.array([v[0] for v in WORST_CASE_SCENARIOS.values()])
+    pool_weights = np.array([v[1] for v in WORST_CASE_SCENARIOS.values()])
+    losses = scenario_losses(allocation, shocks, pool_weights).sum(axis=1)
     total = allocation["current_dollars"].sum()
     print("Maximum exposure: ")
-    for coin, mask in exposure_masks.items():
-        coin_exposure = allocation[mask]["current_dollars"].sum() / total
-        print("  {:<6} {:,.2%}".format(coin, coin_exposure))
+    for coin, loss in zip(WORST_CASE_SCENARIOS.keys(), losses):
+        print("  {:<6} {:,.2%}".format(coin, loss / total))
+
+
+def random_scenarios(n=10_000, depeg_chance=0.05, max_depeg=0.3, dai_follows_usdc=0.8, pool_imbalance=20, pool_weights=None, seed=None):
+    """
+    Draw n depeg and pool imbalance scenarios.
+
+    Every coin independently depegs with `depeg_chance`, losing a uniform
+    fraction of its peg up to `max_depeg`. DAI loses at least `dai_follows_usdc`
+    of any USDC peg loss. Curve pools drift towards the coins that lost the
+    most, their weights scaled by exp(pool_imbalance * shock).
+
+    Returns (shocks, pool_weights), each an (n, coins) array.
+    """
+    rng = np.random.default_rng(seed)
+    coins = len(SCENARIO_COINS)
+    depegged = rng.random((n, coins)) < depeg_chance
+    shocks = np.where(depegged, rng.uniform(0, max_depeg, (n, coins)), 0.0)
+    dai, usdc = SCENARIO_COINS.index("DAI"), SCENARIO_COINS.index("USDC")
+    shocks[:, dai] = np.maximum(shocks[:, dai], shocks[:, usdc] * dai_follows_usdc)
+
+    if pool_weights is None:
+        pool_weights = np.full(coins, 1 / coins)
+    weights = np.asarray(pool_weights) * np.exp(pool_imbalance * shocks)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return shocks, weights
+
+
+def scenario_losses(allocation, shocks, pool_weights, column="current_dollars"):
+    """
+    Dollars lost by every allocation row in every scenario, as an
+    (scenarios, rows) array. Single coin rows lose their coin's shock, Curve
+    pool rows ("*") the shock of the pool's composition in that scenario.
+    """
+    shocks = np.atleast_2d(shocks)
+    pool_weights = np.atleast_2d(pool_weights)
+    dollars = allocation[column].to_numpy(dtype=float)
+    is_pool = (allocation["token"] == "*").to_numpy()
+    coin_index = allocation["token"].map({coin: i for i, coin in enumerate(SCENARIO_COINS)}).fillna(0).astype(int).to_numpy()
+
+    coin_shock = shocks[:, coin_index]
+    pool_shock = (shocks * pool_weights).sum(axis=1, keepdims=True)
+    return np.where(is_pool, pool_shock, coin_shock) * dollars
+
+
+def stress_test(allocation, scenarios=None, confidence=0.99, column="current_dollars", show=True):
+    """
+    Loss distribution of an allocation over a set of scenarios.
+
+    Returns the total loss of every scenario, the value at risk and expected
+    shortfall at `confidence`, and each strategy's share of the expected
+    shortfall (its mean loss over the tail scenarios).
+    """
+    if scenarios is None:
+        scenarios = random_scenarios()
+    shocks, pool_weights = scenarios
+    row_losses = scenario_losses(allocation, shocks, pool_weights, column)
+    losses = row_losses.sum(axis=1)
+
+    var = np.quantile(losses, confidence)
+    tail = losses >= var
+    expected_shortfall = losses[tail].mean()
+    contributions = (
+        pd.Series(row_losses[tail].mean(axis=0), index=allocation.index)
+        .groupby(allocation["strategy"]).sum()
+        .sort_values(ascending=False)
+    )
+
+    if show:
+        total = allocation[column].sum()
+        print("Scenarios: {:,}  Mean loss: ${:,.0f}".format(len(losses), losses.mean()))
+        print("VaR {:.1%}:  ${:,.0f} ({:.2%})".format(confidence, var, var / total))
+        print("Expected shortfall: ${:,.0f} ({:.2%})".format(expected_shortfall, expected_shortfall / total))
+        for strat_name, loss in contributions.items():
+            print("  {:<12} ${:>14,.0f}".format(strat_name, loss))
+
+    return SimpleNamespace(
+        losses=losses,
+        row_losses=row_losses,
+        var=var,
+        expected_shortfall=expected_shortfall,
+        contributions=contributions,
+    )
 
 
 def lookup_strategy(address):
@@ -174,16 +271,16 @@ class TemporaryForkWithVaultStats:
 
     def __exit__(self, *args, **kwargs):
         if self.has_snapshot:
-            snapshot = world.vault_value_checker.snapshots(world.STRATEGIST)
-            vault_change = world.vault_core.totalValue() - snapshot[0]
-            supply_change = world.ousd.totalSupply() - snapshot[1]
+            deltas = world.ousd_value_check.deltas()
+            vault_change = deltas.vault_change
+            supply_change = deltas.supply_change
         else:
             vault_change = world.vault_core.totalValue() - self.before_vault_value
             supply_change = world.ousd.totalSupply() - self.before_total_supply
         after_allocation = with_target_allocations(load_from_blockchain(), self.before_votes)
         print(pretty_allocations(after_allocation))
         print("Coin deltas to target")
-        print(after_allocation.groupby('token')['delta_dollars'].sum().apply("{:,}".format))
+        print(world.amount_strings(after_allocation.groupby('token')['delta_dollars'].sum(), 0))
         allocation_exposure(after_allocation)
         
         print('Vault Direct Holdings:')
@@ -200,27 +297,122 @@ class TemporaryForkWithVaultStats:
         brownie.chain.revert()
 
 
+# "Aave DAI 12.5%", optionally followed by a note such as "(123 votes)"
+VOTE_LINE = re.compile(r"^[ \t]*(.+?)[ \t]+([0-9.]+)[ \t]*%?[ \t]*(?:\(.*\))?[ \t]*$")
+
+
+def parse_vote_percent(value):
+    try:
+        return float(value.strip().rstrip("%"))
+    except ValueError:
+        return None
+
+
+def parse_votes(votes, unparsed=None):
+    """
+    Parse a snapshot vote sheet into a list of [name, percent] pairs.
+
+    Accepts text pasted from snapshot ("Aave DAI 12.5%" per line), a CSV export
+    ("Aave DAI,12.5", with or without a header row and quoting) or a JSON
+    export, either {name: percent} or a list of objects with a name/choice and
+    a percent/value/weight field. Strings that name an existing file are read
+    first.
+
+    Non-empty lines that aren't a vote are added to the `unparsed` list, or
+    raised all at once if no list is given.
+    """
+    if os.path.isfile(votes):
+        with open(votes, "r") as f:
+            votes = f.read()
+
+    stripped = votes.strip()
+    if stripped.startswith("{") or stripped.startswith("["):
+        data = json.loads(stripped)
+        if isinstance(data, dict):
+            return [[name, float(percent)] for name, percent in data.items()]
+        parsed = []
+        for row in data:
+            name = next((row[k] for k in ["name", "choice", "strategy"] if k in row), None)
+            percent = next((row[k] for k in ["percent", "value", "weight"] if k in row), None)
+            if name is None or percent is None:
+                raise Exception("Vote row needs a name/choice/strategy and a percent/value/weight field: %s" % row)
+            parsed.append([name, float(percent)])
+        return parsed
+
+    parsed = []
+    bad_lines = []
+    lines = [line for line in stripped.splitlines() if line.strip()]
+    if any(["," in line for line in lines]):
+        for i, row in enumerate(csv.reader(lines)):
+            percent = parse_vote_percent(row[1]) if len(row) == 2 else None
+            if percent is None and i == 0 and len(row) == 2:
+                # Header row
+                continue
+            if percent is None or not row[0].strip():
+                bad_lines.append(lines[i].strip())
+            else:
+                parsed.append([row[0].strip(), percent])
+    else:
+        for line in lines:
+            m = VOTE_LINE.match(line)
+            percent = parse_vote_percent(m.group(2)) if m else None
+            if percent is None:
+                bad_lines.append(line.strip())
+            else:
+                parsed.append([m.group(1).strip(), percent])
+
+    if unparsed is not None:
+        unparsed.extend(bad_lines)
+    elif bad_lines:
+        raise Exception("Could not parse vote lines: %s" % bad_lines)
+    return parsed
+
+
+def votes_to_targets(allocation, votes):
+    """
+    Target allocation of every allocation row from a vote sheet (see
+    `parse_votes`). Lines that aren't votes and unknown names are all reported
+    in one error. Names listed more than once (snapshot pastes sometimes repeat
+    a strategy) are summed with a warning.
+    """
+    row_index = {key: i for i, key in enumerate(zip(allocation["strategy"], allocation["token"]))}
+    targets = np.zeros(len(allocation))
+    seen = set()
+    unparsed = []
+    unknown = []
+    duplicates = []
+    for name, percent in parse_votes(votes, unparsed):
+        if name in seen:
+            duplicates.append(name)
+        seen.add(name)
+        if name == "Existing Allocation":
+            targets += allocation["current_allocation"].to_numpy() * percent / 100.0
+        elif name in SNAPSHOT_NAMES and tuple(SNAPSHOT_NAMES[name]) in row_index:
+            targets[row_index[tuple(SNAPSHOT_NAMES[name])]] += percent / 100.0
+        elif name in SNAPSHOT_NAMES and percent == 0:
+            # Strategy not in this allocation, nothing to move
+            pass
+        else:
+            unknown.append(name)
+
+    if unparsed or unknown:
+        problems = []
+        if unparsed:
+            problems.append("Lines that are not votes: %s" % unparsed)
+        if unknown:
+            problems.append("Unknown strategy names: %s" % unknown)
+        raise Exception("Could not use votes. %s" % " ".join(problems))
+    if duplicates:
+        print("WARNING: votes listed more than once were summed: %s" % sorted(set(duplicates)))
+    return targets
+
+
 def with_target_allocations(allocation, votes):
     df = allocation.copy()
-    df["target_allocation"] = float(0.0)
     if isinstance(votes, pd.DataFrame):
         df["target_allocation"] = votes["target_allocation"]
     else:
-        for line in votes.splitlines():
-            m = re.search(r"[ \t]*(.+)[ \t]([0-9.]+)", line)
-            if not m:
-                continue
-            strat_name = m.group(1).strip()
-            strat_alloc = float(m.group(2)) / 100.0
-            if strat_name in SNAPSHOT_NAMES:
-                [internal_name, internal_coin] = SNAPSHOT_NAMES[strat_name]
-                mask = (df.strategy == internal_name) & (df.token == internal_coin)
-                df.loc[mask, "target_allocation"] += strat_alloc
-            elif strat_name == "Existing Allocation":
-                pass
-                df["target_allocation"] += df["current_allocation"] * strat_alloc
-            else:
-                raise Exception('Could not look up strategy name "%s"' % strat_name)
+        df["target_allocation"] = votes_to_targets(df, votes)
 
     if df["target_allocation"].sum() > 1.02:
         print(df)
@@ -247,9 +439,9 @@ def pretty_allocations(allocation, close_enough=255_000):
     df.loc[df["delta_dollars"].abs() < close_enough, "s"] = "✔︎"
     df["current_allocation"] = df["current_allocation"].apply("{:.2%}".format)
     df["target_allocation"] = df["target_allocation"].apply("{:.2%}".format)
-    df["current_dollars"] = df["current_dollars"].apply("{:,}".format)
-    df["target_dollars"] = df["target_dollars"].apply("{:,}".format)
-    df["delta_dollars"] = df["delta_dollars"].apply("{:,}".format)
+    df["current_dollars"] = world.amount_strings(df["current_dollars"], 0)
+    df["target_dollars"] = world.amount_strings(df["target_dollars"], 0)
+    df["delta_dollars"] = world.amount_strings(df["delta_dollars"], 0)
     return df.sort_values("strategy")
 
 
@@ -271,26 +463,14 @@ def spread_to_coins(total, per_coin, reverse=False, min_move=5000):
 
 
 def auto_take_snapshot():
-    return [
-        world.vault_core.rebase({"from": world.STRATEGIST}),
-        world.vault_value_checker.takeSnapshot({"from": world.STRATEGIST}),
-    ]
+    return world.ousd_value_check.take_snapshot()
 
 
 def auto_check_snapshot():
-    snapshot = world.vault_value_checker.snapshots(world.STRATEGIST)
-    print(snapshot)
-    vault_change = world.vault_core.totalValue() - snapshot[0]
-    supply_change = world.ousd.totalSupply() - snapshot[1]
-    profit = vault_change - supply_change
-
     return [
-        world.vault_value_checker.checkDelta(
-            profit, # expectedProfit
+        world.ousd_value_check.check_delta(
             500 * int(1e18), # profitVariance
-            vault_change, # expectedVaultChange
             250_000 * int(1e18), # vaultChangeVariance
-            {"from": world.STRATEGIST},
         )
     ]
 
@@ -387,5 +567,285 @@ def auto_exchange_out(allocation, consolidation, exchange):
     return txs
 
 
+# Costs `plan_rebalance` minimizes, in gas. Every transaction pays a base cost
+# and every coin it moves pays its own strategy withdraw / deposit. Moving
+# dollars through a Curve pool strategy also costs slippage, charged per $1000
+# on each pool side of a move (about 1bp at 20 gwei and $2000 ETH). Dollars a
+# row is left off target, even within tolerance, cost more than any of that so
+# rows end up as close to target as the coins allow.
+REBALANCE_MOVE_GAS = 200_000
+REBALANCE_COIN_GAS = 150_000
+REBALANCE_POOL_GAS_PER_1000 = 2_500
+REBALANCE_OFF_TARGET_GAS_PER_1000 = 10_000
+# Slope scaling rounds before settling on the cheapest plan seen
+REBALANCE_ROUNDS = 20
+
+
+def min_cost_flow(node_count, arcs, demand):
+    """
+    Cheapest integer flow over `arcs`, a list of (from, to, lower, upper, cost)
+    between nodes 0..node_count-1, where every node v takes in demand[v] more
+    than it sends out. Returns the flow on every arc, or None when no flow
+    meets the bounds and demands.
+
+    Lower bounds are forced through first, what they and the demands leave
+    unbalanced is fixed by a successive shortest path max flow from an extra
+    source to an extra sink. Bellman-Ford finds the paths as residual arcs can
+    have negative costs.
+    """
+    source = node_count
+    sink = node_count + 1
+    graph = [[] for _ in range(node_count + 2)]  # [to, capacity, cost, reverse index]
+    balance = [-d for d in demand]
+
+    def add_arc(u, v, capacity, cost):
+        graph[u].append([v, capacity, cost, len(graph[v])])
+        graph[v].append([u, 0, -cost, len(graph[u]) - 1])
+        return (u, len(graph[u]) - 1)
+
+    residual_arcs = []
+    for u, v, lower, upper, cost in arcs:
+        if lower > upper:
+            return None
+        residual_arcs.append(add_arc(u, v, upper - lower, cost))
+        balance[u] -= lower
+        balance[v] += lower
+    required = 0
+    for node, b in enumerate(balance):
+        if b > 0:
+            add_arc(source, node, b, 0)
+            required += b
+        elif b < 0:
+            add_arc(node, sink, -b, 0)
+    if sum(balance) != 0:
+        return None
+
+    flowed = 0
+    while flowed < required:
+        distance = [None] * len(graph)
+        previous = [None] * len(graph)
+        distance[source] = 0
+        for _ in range(len(graph) - 1):
+            changed = False
+            for u, edges in enumerate(graph):
+                if distance[u] is None:
+                    continue
+                for i, (v, capacity, cost, _) in enumerate(edges):
+                    if capacity > 0 and (distance[v] is None or distance[u] + cost < distance[v] - 1e-9):
+                        distance[v] = distance[u] + cost
+                        previous[v] = (u, i)
+                        changed = True
+            if not changed:
+                break
+        if distance[sink] is None:
+            return None
+        amount = required - flowed
+        v = sink
+        while v != source:
+            u, i = previous[v]
+            amount = min(amount, graph[u][i][1])
+            v = u
+        v = sink
+        while v != source:
+            u, i = previous[v]
+            graph[u][i][1] -= amount
+            graph[v][graph[u][i][3]][1] += amount
+            v = u
+        flowed += amount
+
+    return [upper - graph[u][i][1] for (u, i), (_, _, _, upper, _) in zip(residual_arcs, arcs)]
+
+
+def plan_rebalance(allocation, tolerance=255_000, min_move=5000, pool_coin="USDC"):
+    """
+    Plan the transfers that bring every (strategy, token) within tolerance of
+    its target for the least gas.
+
+    This is a min cost flow between the allocation rows in units of $1000. A
+    coin row only sends to and receives from rows of the same coin, Curve pool
+    rows (token "*") send and receive any coin, so a pool can also swap one
+    coin for another on the way. Transfers between two pools withdraw and
+    deposit `pool_coin` without touching any coin row. Every row must end up
+    within tolerance, rows outside it without overshooting their target, and
+    is charged for every dollar it is left off target.
+
+    Gas is a fixed cost per transaction (a from, to pair) and per coin in it,
+    so the flow is solved repeatedly with those costs spread over the dollars
+    each pair and coin moved in the previous round (dynamic slope scaling) and
+    the cheapest plan is kept. Coins moving less than min_move between a pair
+    are dropped and the plan is solved again, as is every plan without one of
+    the chosen pairs. Raises when no plan fits.
+
+    Returns a list of [from, to, [[dollars, coin], ...]] moves, see
+    `execute_rebalance_plan`. Moves into a strategy come before moves out of
+    it where possible.
+    """
+    rows = []
+    for _, row in allocation.iterrows():
+        delta = int(row["delta_dollars"])
+        # Net $1000s the row may take in and still be within tolerance
+        if delta >= tolerance:
+            lower, upper = (delta - tolerance) // 1000 + 1, delta // 1000
+        elif delta <= -tolerance:
+            lower, upper = -(-delta // 1000), -(-(delta + tolerance) // 1000) - 1
+        else:
+            lower, upper = (delta - tolerance) // 1000 + 1, -(-(delta + tolerance) // 1000) - 1
+        rows.append(SimpleNamespace(
+            strategy=row["strategy"],
+            token=row["token"],
+            delta=delta,
+            node=len(rows) + 1,
+            target=int(delta / 1000),
+            lower=lower,
+            upper=upper,
+        ))
+    if all([abs(r.delta) < tolerance for r in rows]):
+        return []
+
+    # Every row takes in its target from the other rows. Node 0 makes up the
+    # difference, at REBALANCE_OFF_TARGET_GAS_PER_1000, as far as tolerance allows
+    demand = [-sum([r.target for r in rows])] + [r.target for r in rows]
+    bound_arcs = []
+    for r in rows:
+        bound_arcs.append((0, r.node, 0, r.target - r.lower, REBALANCE_OFF_TARGET_GAS_PER_1000))
+        bound_arcs.append((r.node, 0, 0, r.upper - r.target, REBALANCE_OFF_TARGET_GAS_PER_1000))
+    # No transfer can move more than the rows over target have to give
+    most = max(1, sum([-r.lower for r in rows if r.lower < 0]))
+
+    candidates = []
+    for s in rows:
+        for t in rows:
+            if s.strategy == t.strategy:
+                continue
+            if "*" not in (s.token, t.token) and s.token != t.token:
+                continue
+            pool_sides = [s.token, t.token].count("*")
+            candidates.append(SimpleNamespace(
+                source=s,
+                sink=t,
+                pair=(s.strategy, t.strategy),
+                coin=pool_coin if pool_sides == 2 else [c for c in (s.token, t.token) if c != "*"][0],
+                cost=REBALANCE_POOL_GAS_PER_1000 * pool_sides,
+            ))
+
+    def totals(flows):
+        pairs = {}
+        pair_coins = {}
+        for candidate, units in zip(candidates, flows):
+            if units > 0:
+                pairs[candidate.pair] = pairs.get(candidate.pair, 0) + units
+                key = (candidate.pair, candidate.coin)
+                pair_coins[key] = pair_coins.get(key, 0) + units
+        return pairs, pair_coins
+
+    def plan_gas(flows, off_target):
+        pairs, pair_coins = totals(flows)
+        return (
+            REBALANCE_MOVE_GAS * len(pairs)
+            + REBALANCE_COIN_GAS * len(pair_coins)
+            + sum([c.cost * units for c, units in zip(candidates, flows)])
+            + REBALANCE_OFF_TARGET_GAS_PER_1000 * off_target
+        )
+
+    def solve(banned):
+        "Cheapest (gas, flows) slope scaling finds without the banned pairs and (pair, coin)s"
+        # Round one charges the fixed costs as if every transfer moved all it could
+        move_slope = {c.pair: REBALANCE_MOVE_GAS / most for c in candidates}
+        coin_slope = {(c.pair, c.coin): REBALANCE_COIN_GAS / most for c in candidates}
+        best = None
+        for _ in range(REBALANCE_ROUNDS):
+            arcs = bound_arcs + [
+                (c.source.node, c.sink.node, 0, 0 if c.pair in banned or (c.pair, c.coin) in banned else most,
+                 c.cost + move_slope[c.pair] + coin_slope[(c.pair, c.coin)])
+                for c in candidates
+            ]
+            flows = min_cost_flow(len(rows) + 1, arcs, demand)
+            if flows is None:
+                return None
+            off_target = sum(flows[:len(bound_arcs)])
+            flows = flows[len(bound_arcs):]
+            if best is None or plan_gas(flows, off_target) < best[0]:
+                best = (plan_gas(flows, off_target), flows)
+            pairs, pair_coins = totals(flows)
+            if all([move_slope[p] == REBALANCE_MOVE_GAS / units for p, units in pairs.items()]) and all(
+                [coin_slope[k] == REBALANCE_COIN_GAS / units for k, units in pair_coins.items()]
+            ):
+                break
+            for p, units in pairs.items():
+                move_slope[p] = REBALANCE_MOVE_GAS / units
+            for k, units in pair_coins.items():
+                coin_slope[k] = REBALANCE_COIN_GAS / units
+        return best
+
+    def solve_min_move(banned):
+        "`solve`, dropping coins that move less than min_move until none do"
+        banned = set(banned)
+        while True:
+            solved = solve(banned)
+            if solved is None:
+                return None, banned
+            _, pair_coins = totals(solved[1])
+            small = [k for k, units in pair_coins.items() if units * 1000 < min_move]
+            if not small:
+                return solved, banned
+            banned.update(small)
+
+    solved, banned = solve_min_move(set())
+    if solved is None:
+        over = sum([-r.delta for r in rows if r.delta <= -tolerance])
+        under = sum([r.delta for r in rows if r.delta >= tolerance])
+        raise Exception(
+            "plan_rebalance: no plan brings every row within {:,} of target "
+            "(${:,} over target, ${:,} under target, {} coin moves below min_move dropped)".format(
+                tolerance, over, under, len(banned)
+            )
+        )
+    # Slope scaling can settle on a pair a cheaper plan does without, so try
+    # dropping each pair, smallest first, and keep whatever saves gas
+    improved = True
+    while improved:
+        improved = False
+        pairs, _ = totals(solved[1])
+        for pair in sorted(pairs, key=lambda p: pairs[p]):
+            candidate, candidate_banned = solve_min_move(banned | set([pair]))
+            if candidate is not None and candidate[0] < solved[0]:
+                solved, banned = candidate, candidate_banned
+                improved = True
+                break
+    best = solved[1]
+
+    funds = {}
+    _, pair_coins = totals(best)
+    for (pair, coin), units in pair_coins.items():
+        funds.setdefault(pair, []).append([units * 1000, CORE_STABLECOINS[coin]])
+    print("plan_rebalance: {} moves, {} coin transfers, ~{:,} gas".format(
+        len(funds), len(pair_coins), REBALANCE_MOVE_GAS * len(funds) + REBALANCE_COIN_GAS * len(pair_coins)
+    ))
+
+    pending = sorted(funds.items(), key=lambda m: -sum([f[0] for f in m[1]]))
+    moves = []
+    while pending:
+        incoming = set([to_strat for (_, to_strat), _ in pending])
+        ready = [m for m in pending if m[0][0] not in incoming] or pending[:1]
+        pending.remove(ready[0])
+        (from_strat, to_strat), coins = ready[0]
+        moves.append([from_strat, to_strat, sorted(coins, key=lambda f: -f[0])])
+    return moves
+
+
+def execute_rebalance_plan(moves):
+    "Execute the moves of `plan_rebalance` and return the transactions"
+    txs = []
+    for from_name, to_name, funds in moves:
+        print("rebalance", from_name, "->", to_name, "|", pretty_amounts(funds))
+        if from_name == "VAULT":
+            txs.append(to_strat(to_name, funds))
+        elif to_name == "VAULT":
+            txs.append(from_strat(from_name, funds))
+        else:
+            txs.append(reallocate(from_name, to_name, funds))
+    return txs
+
+
 def pretty_amounts(amounts):
     return ", ".join(["{:,} {}".format(x[0], x[1].symbol()) for x in amounts])
@@ -2,14 +2,7 @@ from world import *
 from prices import *
 from oneinch import *
 
-from brownie.convert.datatypes import HexString
-import eth_abi
-
-
-router_1inch = load_contract('router_1inch_v5', ROUTER_1INCH_V5)
-SWAP_SELECTOR = "0x12aa3caf" #swap(address,(address,address,address,address,uint256,uint256,uint256),bytes,bytes)
-UNISWAP_SELECTOR = "0xf78dc253" #unoswapTo(address,address,uint256,uint256,uint256[])
-UNISWAPV3_SWAP_TO_SELECTOR = "0xbc80f1a8" #uniswapV3SwapTo(address,uint256,uint256,uint256[])
+from oneinch_decoder import swapper_data
 
 def get_balance_splits(otoken_address):
     buyback = oeth_buyback if otoken_address == OETH else ousd_buyback
@@ -85,19 +78,8 @@ def build_1inch_buyback_tx(otoken_address, buyback_token, amount, max_slippage=1
         protocols=protocols
     )
 
-    input_decoded = router_1inch.decode_input(result.input)
-
-    selector = result.input[:10]
-    data = '0x'
-    # Swap selector
-    if selector == SWAP_SELECTOR:
-        data += eth_abi.encode_abi(['bytes4', 'address', 'bytes'], [HexString(selector, "bytes4"), input_decoded[1][0], input_decoded[1][3]]).hex()
-    elif selector == UNISWAP_SELECTOR or selector == UNISWAPV3_SWAP_TO_SELECTOR:
-        data += eth_abi.encode_abi(['bytes4', 'uint256[]'], [HexString(selector, "bytes4"), input_decoded[1][3]]).hex()
+    data = swapper_data(result.input)
 
-    else: 
-        raise Exception("Unrecognized 1Inch swap selector {}".format(selector))
-    
     print(buyback.address, amount, min_expected, data)
 
     if buyback_token == OGN:
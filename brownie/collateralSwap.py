@@ -1,18 +1,74 @@
 from brownie import Contract
-from brownie.convert.datatypes import HexString
 import os
 import io
 import requests
-import eth_abi
 
 from world import *
 from prices import *
 from oneinch import *
-
-OUSD_ORACLE_ROUTER_ADDRESS = vault_admin.priceProvider()
-OETH_ORACLE_ROUTER_ADDRESS = vault_oeth_admin.priceProvider()
-oracle_router = load_contract('oracle_router_v2', OUSD_ORACLE_ROUTER_ADDRESS)
-oeth_oracle_router = load_contract('oracle_router_v2', OETH_ORACLE_ROUTER_ADDRESS)
+from oneinch_decoder import swapper_data
+
+# Oracle prices of all the assets supported by a vault. The oracle router and
+# asset list are only loaded on first use, prices are read for all assets in a
+# single Multicall and cached until the chain moves to another block.
+class OracleSnapshot:
+    def __init__(self, c_vault_core, c_vault_admin):
+        self.vault_core = c_vault_core
+        self.vault_admin = c_vault_admin
+        self.router = None
+        self.assets = []
+        self.block = None
+        self.prices = {}
+        # asset -> "ok" or the reason the oracle router reverted, e.g. a stale feed
+        self.feed_status = {}
+
+    def refresh(self):
+        block = brownie.chain.height
+        if block == self.block:
+            return self
+
+        if self.router is None:
+            self.router = load_contract('oracle_router_v2', self.vault_admin.priceProvider())
+            self.assets = [asset.lower() for asset in self.vault_core.getAllAssets()]
+
+        results = multicall_raw([(self.router.price, [asset]) for asset in self.assets], block)
+
+        self.block = block
+        self.prices = {}
+        self.feed_status = {}
+        for asset, (success, data) in zip(self.assets, results):
+            if success:
+                self.prices[asset] = self.router.price.decode_output(data)
+                self.feed_status[asset] = "ok"
+            else:
+                self.feed_status[asset] = decode_revert_reason(data)
+        return self
+
+    def price(self, asset):
+        self.refresh()
+        asset = asset.lower()
+        if asset not in self.prices:
+            raise Exception("No oracle price for {}: {}".format(asset, self.feed_status.get(asset, "not a vault asset")))
+        return self.prices[asset]
+
+    # Oracles communicate the price of token to ETH (or USD) so to derive the price
+    # of one token to another we divide the two oracle prices:
+    # X_TOKEN/ETH * ETH/Y_TOKEN to get the X_TOKEN/Y_TOKEN oracle price.
+    def quote(self, from_token, to_token, from_amount):
+        return scale_amount(from_token, to_token, self.price(from_token) * from_amount / self.price(to_token))
+
+    def show(self):
+        self.refresh()
+        print("------ Oracle prices at block {} ------".format(self.block))
+        for asset in self.assets:
+            label = inv_contracts_map.get(asset, asset)
+            if asset in self.prices:
+                print("{:<24} {} {}".format(label, prices(self.prices[asset]), self.feed_status[asset]))
+            else:
+                print("{:<24} {} {}".format(label, leading_whitespace("-"), console_colors["FAIL"] + self.feed_status[asset] + console_colors["ENDC"]))
+
+ousd_oracle_snapshot = OracleSnapshot(vault_core, vault_admin)
+oeth_oracle_snapshot = OracleSnapshot(oeth_vault_core, vault_oeth_admin)
 
 swapper_address = SWAPPER_1INCH
 
@@ -35,11 +91,6 @@ def get_1inch_swap(
     c_vault_core = vault_core if from_token in OUSD_ASSET_ADDRESSES else oeth_vault_core
     c_vault_admin = vault_admin if from_token in OUSD_ASSET_ADDRESSES else vault_oeth_admin
 
-    router_1inch = load_contract('router_1inch_v5', ROUTER_1INCH_V5)
-    SWAP_SELECTOR = "0x12aa3caf" #swap(address,(address,address,address,address,uint256,uint256,uint256),bytes,bytes)
-    UNISWAP_SELECTOR = "0xf78dc253" #unoswapTo(address,address,uint256,uint256,uint256[])
-    UNISWAPV3_SWAP_TO_SELECTOR = "0xbc80f1a8" #uniswapV3SwapTo(address,uint256,uint256,uint256[])
-
     result = get_1inch_swap_data(
         from_token=from_token.lower(),
         to_token=to_token.lower(),
@@ -50,18 +101,7 @@ def get_1inch_swap(
         protocols=protocols,
     )
 
-    input_decoded = router_1inch.decode_input(result.input)
-
-    selector = result.input[:10]
-    data = '0x'
-    # Swap selector
-    if selector == SWAP_SELECTOR:
-        data += eth_abi.encode_abi(['bytes4', 'address', 'bytes'], [HexString(selector, "bytes4"), input_decoded[1][0], input_decoded[1][3]]).hex()
-    elif selector == UNISWAP_SELECTOR or selector == UNISWAPV3_SWAP_TO_SELECTOR:
-        data += eth_abi.encode_abi(['bytes4', 'uint256[]'], [HexString(selector, "bytes4"), input_decoded[1][3]]).hex()
-
-    else: 
-        raise Exception("Unrecognized 1Inch swap selector {}".format(selector))
+    data = swapper_data(result.input)
 
     swap_collateral_data = c_vault_admin.swapCollateral.encode_input(
         from_token.lower(),
@@ -91,17 +131,8 @@ def get_1inch_swap(
 # using oracle router calculate what the expected `toTokenAmount` should be
 # this function fails if Oracle data is too stale    
 def get_oracle_router_quote(from_token, to_token, from_amount):
-    router = oracle_router if from_token in OUSD_ASSET_ADDRESSES else oeth_oracle_router
-    
-    # Oracles communicate the price of token to ETH so to derive the price
-    # of one token to another we should multiply 2 oracle prices: 
-    # X_TOKEN/ETH * ETH/Y_TOKEN to get the X_TOKEN/Y_TOKEN oracle price.
-    # 
-    # To get to ETH/Y_TOKEN price we just use 1 / (Y_TOKEN/ETH)
-    from_price = router.price(from_token)
-    to_price = 10**18 / router.price(to_token)
-
-    return scale_amount(from_token, to_token, from_price * to_price * from_amount / 10**18)
+    snapshot = ousd_oracle_snapshot if from_token in OUSD_ASSET_ADDRESSES else oeth_oracle_snapshot
+    return snapshot.quote(from_token, to_token, from_amount)
 
 console_colors = {}
 console_colors["ENDC"] = '\033[0m'
@@ -0,0 +1,160 @@
+from addresses import *
+
+from concurrent.futures import ThreadPoolExecutor
+from eth_utils import function_signature_to_4byte_selector
+from types import SimpleNamespace
+import eth_abi
+import json
+import os
+import pandas as pd
+import web3
+
+# Read only view of every vault across chains, fetched without a brownie
+# session. Every chain gets its own web3 connection and is read concurrently,
+# each in two Multicall3 round trips.
+#
+# RPC endpoints come from env variables and can point to local forks, e.g.
+#   export BASE_RPC_URL=http://127.0.0.1:8546
+# Chains without an RPC URL are skipped.
+
+CHAINS = {
+    "mainnet": SimpleNamespace(
+        rpc_env="MAINNET_RPC_URL",
+        vaults=[("OUSD", VAULT_PROXY_ADDRESS, OUSD), ("OETH", VAULT_OETH_PROXY_ADDRESS, OETH)],
+    ),
+    "base": SimpleNamespace(
+        rpc_env="BASE_RPC_URL",
+        vaults=[("superOETHb", OETHB_VAULT_PROXY_ADDRESS, OETHB)],
+    ),
+    "sonic": SimpleNamespace(
+        rpc_env="SONIC_RPC_URL",
+        vaults=[("OS", OS_VAULT_PROXY_ADDRESS, OS)],
+    ),
+    "plume": SimpleNamespace(
+        rpc_env="PLUME_RPC_URL",
+        vaults=[("superOETHp", OETHP_VAULT_PROXY, OETHP)],
+    ),
+}
+
+RPC_TIMEOUT = 60
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'abi', 'multicall3.json'), 'r') as f:
+    MULTICALL3_ABI = json.load(f)
+
+def rpc_url(chain):
+    url = os.getenv(CHAINS[chain].rpc_env)
+    if url is None and chain == "mainnet" and os.getenv('WEB3_INFURA_PROJECT_ID'):
+        url = "https://mainnet.infura.io/v3/" + os.getenv('WEB3_INFURA_PROJECT_ID')
+    return url
+
+# A view call: ("totalValue()", [], ["uint256"]) against target
+def view_call(target, signature, args, output_types):
+    arg_types = signature[signature.index('(') + 1:-1]
+    data = function_signature_to_4byte_selector(signature)
+    if arg_types:
+        data += eth_abi.encode_abi(arg_types.split(','), args)
+    return (web3.Web3.toChecksumAddress(target), data, output_types)
+
+# Run view calls in one aggregate3 call. Reverted calls return None
+def chain_multicall(w3, calls, block_identifier):
+    multicall3 = w3.eth.contract(address=MULTICALL3, abi=MULTICALL3_ABI)
+    results = multicall3.functions.aggregate3(
+        [(target, True, data) for target, data, _ in calls]
+    ).call(block_identifier=block_identifier)
+    decoded = []
+    for (_, _, output_types), (success, data) in zip(calls, results):
+        if not success or len(data) == 0:
+            decoded.append(None)
+            continue
+        values = eth_abi.decode_abi(output_types, data)
+        decoded.append(values[0] if len(values) == 1 else values)
+    return decoded
+
+def fetch_chain(chain, block_identifier="latest"):
+    w3 = web3.Web3(web3.HTTPProvider(rpc_url(chain), request_kwargs={'timeout': RPC_TIMEOUT}))
+    vaults = CHAINS[chain].vaults
+    block = w3.eth.get_block(block_identifier)['number']
+
+    # Round 1: vault totals and what each vault holds
+    calls = []
+    for _, vault, otoken in vaults:
+        calls += [
+            view_call(vault, "totalValue()", [], ["uint256"]),
+            view_call(vault, "getAllStrategies()", [], ["address[]"]),
+            view_call(vault, "getAllAssets()", [], ["address[]"]),
+            view_call(otoken, "totalSupply()", [], ["uint256"]),
+        ]
+    overview = chain_multicall(w3, calls, block)
+    for (_, vault, otoken), results in zip(vaults, [overview[i:i + 4] for i in range(0, len(overview), 4)]):
+        for call, result in zip(["totalValue()", "getAllStrategies()", "getAllAssets()", "totalSupply()"], results):
+            if result is None:
+                print("WARNING: {} {} failed on {}, its values are skipped".format(
+                    vault if call != "totalSupply()" else otoken, call, chain
+                ))
+
+    # Round 2: every strategy balance and idle vault balance of every asset
+    calls = []
+    keys = []
+    for i, (product, vault, _) in enumerate(vaults):
+        strategies, assets = overview[i * 4 + 1] or [], overview[i * 4 + 2] or []
+        for asset in assets:
+            calls += [
+                view_call(asset, "symbol()", [], ["string"]),
+                view_call(asset, "decimals()", [], ["uint8"]),
+                view_call(asset, "balanceOf(address)", [vault], ["uint256"]),
+            ]
+            keys.append((product, "vault", vault, asset))
+            for strategy in strategies:
+                calls.append(view_call(strategy, "checkBalance(address)", [asset], ["uint256"]))
+                keys.append((product, "strategy", strategy, asset))
+    balances = iter(chain_multicall(w3, calls, block))
+
+    rows = []
+    for i, (product, vault, otoken) in enumerate(vaults):
+        total_value, supply = overview[i * 4], overview[i * 4 + 3]
+        if total_value is not None:
+            rows.append([chain, block, product, "total_value", vault, None, total_value / 1e18])
+        if supply is not None:
+            rows.append([chain, block, product, "supply", otoken, None, supply / 1e18])
+
+    symbol, decimals = None, None
+    for product, kind, holder, asset in keys:
+        if kind == "vault":
+            symbol, decimals = next(balances), next(balances)
+        balance = next(balances)
+        if balance is None or (kind == "strategy" and balance == 0):
+            # Strategy doesn't support the asset
+            continue
+        rows.append([chain, block, product, kind, holder, symbol, balance / 10 ** (decimals or 18)])
+    return rows
+
+# Fetch every configured chain at once. `blocks` optionally pins a block per chain
+# Returns a DataFrame with one row per vault total, OToken supply and (holder, asset) balance
+def fetch_all(chains=None, blocks={}):
+    if chains is None:
+        chains = [chain for chain in CHAINS.keys() if rpc_url(chain) is not None]
+    if len(chains) == 0:
+        raise Exception("No chains configured, set one of {}".format(", ".join([c.rpc_env for c in CHAINS.values()])))
+
+    with ThreadPoolExecutor(max_workers=len(chains)) as executor:
+        results = list(executor.map(
+            lambda chain: fetch_chain(chain, blocks.get(chain, "latest")),
+            chains
+        ))
+
+    return pd.DataFrame(
+        [row for rows in results for row in rows],
+        columns=["chain", "block", "product", "kind", "address", "asset", "amount"],
+    )
+
+def show_all(chains=None, blocks={}):
+    df = fetch_all(chains, blocks)
+    totals = df[df["kind"].isin(["total_value", "supply"])].pivot_table(
+        index=["chain", "product"], columns="kind", values="amount"
+    )
+    totals["backing"] = totals["total_value"] / totals["supply"]
+    print(totals.to_string(float_format="{:,.2f}".format))
+    print("")
+    holdings = df[df["kind"].isin(["vault", "strategy"])]
+    print(holdings.groupby(["chain", "product", "kind", "address", "asset"])["amount"].sum().to_string(float_format="{:,.2f}".format))
+    return df
@@ -0,0 +1,149 @@
+from world_abstract import *
+from events import *
+
+import os
+import sqlite3
+import pandas as pd
+
+# Indexes vault, strategy and OToken events into a local SQLite database so
+# repeated analyses are local queries. Logs are pulled in block ranges that
+# shrink when the provider rejects a request and grow back while requests
+# succeed. Progress is saved per (chain, address, event) after every range, so
+# an interrupted run resumes where it stopped and addresses added later (e.g. a
+# new strategy) are backfilled from the start block.
+#
+#   from world import *
+#   from event_indexer import *
+#   index_vault("oeth", VAULT_OETH_PROXY_ADDRESS, OETH, start_block=17_000_000)
+#   query("select event, count(*) from logs group by event")
+
+EVENT_DB = os.getenv('EVENT_DB', 'events.sqlite')
+DEFAULT_EVENTS = [
+    "Mint", "Redeem", "Transfer", "TotalSupplyUpdatedHighres", "YieldDistribution",
+    "AssetAllocated", "Deposit", "Withdrawal", "RewardTokenCollected",
+]
+MIN_CHUNK = 10
+MAX_CHUNK = 100_000
+START_CHUNK = 10_000
+
+def connect(path=EVENT_DB):
+    db = sqlite3.connect(path)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS logs (
+            chain_id INTEGER, block INTEGER, tx_hash TEXT, log_index INTEGER,
+            address TEXT, event TEXT, args TEXT,
+            PRIMARY KEY (chain_id, tx_hash, log_index)
+        )""")
+    db.execute("CREATE INDEX IF NOT EXISTS logs_event ON logs (chain_id, event, block)")
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS address_high_water (
+            chain_id INTEGER, address TEXT, event TEXT, block INTEGER,
+            PRIMARY KEY (chain_id, address, event)
+        )""")
+    return db
+
+# Last block indexed for an address and event, None if never indexed
+def high_water(db, chain_id, address, event):
+    row = db.execute(
+        "SELECT block FROM address_high_water WHERE chain_id = ? AND address = ? AND event = ?",
+        (chain_id, address.lower(), event)
+    ).fetchone()
+    return row[0] if row else None
+
+# JSON safe argument values. Integers are strings, SQLite can't hold a uint256
+def json_value(value):
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [json_value(v) for v in value]
+    return value
+
+def log_rows(chain_id, logs):
+    rows = []
+    for log in logs:
+        decoded = decode_log(log['topics'], log['data'])
+        if decoded is None:
+            continue
+        event, args = decoded
+        rows.append((
+            chain_id,
+            log['blockNumber'],
+            log['transactionHash'].hex(),
+            log['logIndex'],
+            log['address'],
+            event.name,
+            json.dumps({k: json_value(v) for k, v in args.items()}),
+        ))
+    return rows
+
+# Index `event_names` emitted by `addresses` from start_block (or each
+# address's saved high water mark) up to end_block (defaults to the latest block).
+# Addresses that are at the same block are fetched together.
+def index_events(name, addresses, start_block, end_block=None, event_names=DEFAULT_EVENTS, db_path=EVENT_DB):
+    chain_id = brownie.chain.id
+    db = connect(db_path)
+    if end_block is None:
+        end_block = brownie.chain.height
+
+    groups = {}
+    for address in addresses:
+        saved = [high_water(db, chain_id, address, event) for event in event_names]
+        # An event added to event_names later has no mark yet and starts over
+        resume = start_block if None in saved else max(start_block, min(saved) + 1)
+        groups.setdefault(resume, []).append(address)
+
+    indexed = 0
+    for from_block, group in sorted(groups.items()):
+        indexed += index_range(db, chain_id, name, group, from_block, end_block, event_names)
+    db.close()
+    return indexed
+
+def index_range(db, chain_id, name, addresses, from_block, end_block, event_names):
+    topics = event_topics(event_names)
+    chunk = START_CHUNK
+    indexed = 0
+    while from_block <= end_block:
+        to_block = min(from_block + chunk - 1, end_block)
+        try:
+            logs = brownie.web3.eth.get_logs({
+                'fromBlock': from_block,
+                'toBlock': to_block,
+                'address': [brownie.web3.toChecksumAddress(a) for a in addresses],
+                'topics': [topics],
+            })
+        except Exception as e:
+            # Providers cap the block range or number of results per request
+            if chunk <= MIN_CHUNK:
+                raise e
+            chunk = max(chunk // 2, MIN_CHUNK)
+            continue
+
+        rows = log_rows(chain_id, logs)
+        db.executemany("INSERT OR IGNORE INTO logs VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        db.executemany(
+            "INSERT OR REPLACE INTO address_high_water VALUES (?, ?, ?, ?)",
+            [(chain_id, address.lower(), event, to_block) for address in addresses for event in event_names]
+        )
+        db.commit()
+        indexed += len(rows)
+        print("{} blocks {:,} - {:,}: {} events".format(name, from_block, to_block, len(rows)))
+
+        from_block = to_block + 1
+        chunk = min(chunk * 2, MAX_CHUNK)
+    return indexed
+
+# Index the vault, its OToken and every strategy currently approved on the vault
+def index_vault(name, vault_address, otoken_address, start_block, end_block=None, event_names=DEFAULT_EVENTS, db_path=EVENT_DB):
+    vault = load_contract('vault_core', vault_address)
+    addresses = [vault_address, otoken_address] + list(vault.getAllStrategies())
+    return index_events(name, addresses, start_block, end_block, event_names, db_path)
+
+def query(sql, params=(), db_path=EVENT_DB):
+    db = connect(db_path)
+    df = pd.read_sql_query(sql, db, params=params)
+    db.close()
+    return df
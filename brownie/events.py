@@ -0,0 +1,76 @@
+from collections import namedtuple
+import glob
+import json
+import os
+import eth_abi
+from eth_utils import keccak
+
+from abi_types import abi_input_type
+
+# Decodes raw logs against every event in the ABIs in abi/. The table is built
+# once, keyed by (topic0, number of topics) since the same signature can have a
+# different set of indexed arguments (e.g. ERC20 vs ERC721 Transfer).
+
+ABI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'abi')
+
+Event = namedtuple('Event', ['name', 'signature', 'topic', 'indexed_names', 'indexed_types', 'data_names', 'data_types'])
+
+def load_abi(path):
+    with open(path, 'r') as f:
+        abi = json.load(f)
+    # Some ABIs are saved as full build artifacts
+    return abi['abi'] if isinstance(abi, dict) else abi
+
+def build_event_table():
+    table = {}
+    for path in sorted(glob.glob(os.path.join(ABI_DIR, '*.json'))):
+        for item in load_abi(path):
+            if item.get('type') != 'event' or item.get('anonymous'):
+                continue
+            types = [abi_input_type(i) for i in item['inputs']]
+            signature = "{}({})".format(item['name'], ",".join(types))
+            indexed = [i for i, abi_input in enumerate(item['inputs']) if abi_input['indexed']]
+            data = [i for i, abi_input in enumerate(item['inputs']) if not abi_input['indexed']]
+            event = Event(
+                item['name'],
+                signature,
+                keccak(text=signature),
+                [item['inputs'][i]['name'] for i in indexed],
+                [types[i] for i in indexed],
+                [item['inputs'][i]['name'] for i in data],
+                [types[i] for i in data],
+            )
+            table.setdefault((event.topic, len(indexed) + 1), event)
+    return table
+
+EVENT_TABLE = build_event_table()
+
+# topic0 of every known event with the given name
+def event_topics(names):
+    return sorted(set(['0x' + e.topic.hex() for e in EVENT_TABLE.values() if e.name in names]))
+
+def to_bytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith('0x') else value)
+    return bytes(value)
+
+# Decode a raw log. Returns (event, {argument name: value}) or None for unknown events.
+# Indexed dynamic arguments (string, bytes, arrays) only have their hash in the topic
+# and are returned as bytes32.
+def decode_log(topics, data):
+    if len(topics) == 0:
+        return None
+    topics = [to_bytes(t) for t in topics]
+    event = EVENT_TABLE.get((topics[0], len(topics)))
+    if event is None:
+        return None
+
+    args = {}
+    for name, abi_type, topic in zip(event.indexed_names, event.indexed_types, topics[1:]):
+        if abi_type in ('string', 'bytes') or abi_type.endswith(']') or abi_type.startswith('('):
+            args[name] = topic
+        else:
+            args[name] = eth_abi.decode_single(abi_type, topic)
+    values = eth_abi.decode_abi(event.data_types, to_bytes(data))
+    args.update(zip(event.data_names, values))
+    return event, args
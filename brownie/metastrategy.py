@@ -150,112 +150,43 @@ def set_no_collateral_minter(address):
     sim_governor_execute(governor.proposalCount())
 
 #observe metapool balance changes and virtual price
-class MetapoolBalances:
+class MetapoolBalances(Observe):
     def __init__(self, txOptions, metapool):
-        self.txOptions=txOptions
-        self.metapool=metapool
-        self.mainCoinName=get_erc20_name(self.metapool.coins(0))
-
-    def __enter__(self):
-        self.virtual_price = self.metapool.get_virtual_price()
-        self.main_coin_balance = self.metapool.balances(0)
-        self.crv3_balance = self.metapool.balances(1)
-        self.tilt = self.main_coin_balance - self.crv3_balance
-        return self
-
-    def __exit__(self, *args, **kwargs):
-        virtual_price = self.metapool.get_virtual_price()
-        main_coin_balance = self.metapool.balances(0)
-        crv3_balance = self.metapool.balances(1)
-        tilt = main_coin_balance- crv3_balance
-
-        print("-------- " + self.mainCoinName + " Metapool changes ---------")
-        print("                    " + leading_whitespace("Before") + " " + leading_whitespace("After") + " " + leading_whitespace("Difference"))
-        print((self.mainCoinName + ":").ljust(20) + c18(self.main_coin_balance) + " " + c18(main_coin_balance) + " " + c18(main_coin_balance - self.main_coin_balance))
-        print("3CRV:               " + c18(self.crv3_balance) + " " + c18(crv3_balance) + " " + c18(crv3_balance - self.crv3_balance))
-        print("Tilt:               " + c18(self.tilt) + " " + c18(tilt) + " " + c18(tilt-self.tilt))
-        print("Virtual price:      " + c6(self.virtual_price) + " " + c6(virtual_price) + " " + c6(virtual_price - self.virtual_price))
-        print("----------------------------------------")
+        self.mainCoinName=get_erc20_name(metapool.coins(0))
+        super().__init__(self.mainCoinName + " Metapool", [
+            observe_row(self.mainCoinName, (metapool.balances, [0])),
+            observe_row("3CRV", (metapool.balances, [1])),
+            observe_row("Tilt", lambda v: v[self.mainCoinName] - v["3CRV"]),
+            observe_row("Virtual price", (metapool.get_virtual_price, []), c6),
+        ])
 
 #observe 3crv balance changes and virtual price
-class Crv3Balances:
+class Crv3Balances(Observe):
     def __init__(self, txOptions):
-        self.txOptions=txOptions
-
-    def __enter__(self):
-        self.virtual_price = threepool_swap.get_virtual_price()
-        self.dai_balance = threepool_swap.balances(0)
-        self.usdc_balance = threepool_swap.balances(1)
-        self.usdt_balance = threepool_swap.balances(2)
-        self.total = self.dai_balance + self.usdc_balance*1e12 + self.usdt_balance*1e12
-        return self
-
-    def __exit__(self, *args, **kwargs):
-        virtual_price = threepool_swap.get_virtual_price()
-        dai_balance = threepool_swap.balances(0)
-        usdc_balance = threepool_swap.balances(1)
-        usdt_balance = threepool_swap.balances(2)
-        total = dai_balance + usdc_balance*1e12 + usdt_balance*1e12
-
-        print("---------- 3CRV pool changes -----------")
-        print("                " + leading_whitespace("Before") + " " + leading_whitespace("After") + " " + leading_whitespace("Difference"))
-        print("DAI:            " + c18(self.dai_balance) + " " + c18(dai_balance) + " " + c18(dai_balance - self.dai_balance))
-        print("USDC:           " + c6(self.usdc_balance) + " " + c6(usdc_balance) + " " + c6(usdc_balance - self.usdc_balance))
-        print("USDT:           " + c6(self.usdt_balance) + " " + c6(usdt_balance) + " " + c6(usdt_balance - self.usdt_balance))
-        print("Total:          " + c18(self.total) + " " + c18(total) + " " + c18(total - self.total))
-        print("Virtual price:  " + c6(self.virtual_price) + " " + c6(virtual_price) + " " + c6(virtual_price - self.virtual_price))
-        print("----------------------------------------")
+        super().__init__("3CRV pool", [
+            observe_row("DAI", (threepool_swap.balances, [0])),
+            observe_row("USDC", (threepool_swap.balances, [1]), c6),
+            observe_row("USDT", (threepool_swap.balances, [2]), c6),
+            observe_row("Total", lambda v: v["DAI"] + v["USDC"] * 10**12 + v["USDT"] * 10**12),
+            observe_row("Virtual price", (threepool_swap.get_virtual_price, []), c6),
+        ])
 
 # observe how OUSD balance changes for a random account
-class AccountOUSDBalance:
+class AccountOUSDBalance(Observe):
     def __init__(self, txOptions):
-        self.txOptions=txOptions
+        super().__init__("Random account OUSD balance", balance_rows(RANDOM_ACCOUNT, [("OUSD balance", ousd, c18)]))
 
-    def __enter__(self):
-        self.ousdBalance = ousd.balanceOf(RANDOM_ACCOUNT, OPTS)
-        return self
 
-    def __exit__(self, *args, **kwargs):
-        ousdBalance = ousd.balanceOf(RANDOM_ACCOUNT, OPTS)
-
-        print("--- Random account OUSD balance change ---")
-        print("                      " + leading_whitespace("Before") + " " + leading_whitespace("After") + " " + leading_whitespace("Difference"))
-        print("OUSD balance :   " + c18(self.ousdBalance) + " " + c18(ousdBalance) + " " + c18(ousdBalance - self.ousdBalance))
-        print("------------------------------------------")
-
-
-class ObserveMeBalances:
+class ObserveMeBalances(Observe):
     def __init__(self, txOptions):
-        self.txOptions=txOptions
-
-    def __enter__(self):
-        self.ousd_balance=ousd.balanceOf(me, OPTS)
-        self.usdt_balance=usdt.balanceOf(me, OPTS)
-        self.usdc_balance=usdc.balanceOf(me, OPTS)
-        self.dai_balance=dai.balanceOf(me, OPTS)
-        self.crv3_balance=threepool_lp.balanceOf(me, OPTS)
-        self.crv3_price=threepool_swap.get_virtual_price(OPTS)
-        self.crv3_dollar_value = self.crv3_price * self.crv3_balance / 1e18
-        self.total=self.ousd_balance+self.usdt_balance*1e12+self.usdc_balance*1e12+self.dai_balance+self.crv3_dollar_value
-        return self
-
-    def __exit__(self, *args, **kwargs):
-        ousd_balance=ousd.balanceOf(me, OPTS)
-        usdt_balance=usdt.balanceOf(me, OPTS)
-        usdc_balance=usdc.balanceOf(me, OPTS)
-        dai_balance=dai.balanceOf(me, OPTS)
-        crv3_balance=threepool_lp.balanceOf(me, OPTS)
-        crv3_price=threepool_swap.get_virtual_price(OPTS)
-        crv3_dollar_value = crv3_price * crv3_balance / 1e18
-        total=ousd_balance+usdt_balance*1e12+usdc_balance*1e12+dai_balance+crv3_dollar_value
-
-        print("----------- Me account changes ---------")
-        print("             " + leading_whitespace("Before") + " " + leading_whitespace("After") + " " + leading_whitespace("Difference"))
-        print("OUSD:        " + c18(self.ousd_balance) + " " + c18(ousd_balance) + " " + c18(ousd_balance - self.ousd_balance))
-        print("USDT:        " + c6(self.usdt_balance) + " " + c6(usdt_balance) + " " + c6(usdt_balance - self.usdt_balance))
-        print("USDC:        " + c6(self.usdc_balance) + " " + c6(usdc_balance) + " " + c6(usdc_balance-self.usdc_balance))
-        print("DAI:         " + c18(self.dai_balance) + " " + c18(dai_balance) + " " + c18(dai_balance - self.dai_balance))
-        print("3CRV(token): " + c18(self.crv3_balance) + " " + c18(crv3_balance) + " " + c18(crv3_balance - self.crv3_balance))
-        print("3CRV($value): " + c18(self.crv3_dollar_value) + " " + c18(crv3_dollar_value) + " " + c18(crv3_dollar_value - self.crv3_dollar_value))
-        print("Total:       " + c18(self.total) + " " + c18(total) + " " + c18(total - self.total))
-        print("----------------------------------------")
+        super().__init__("Me account", balance_rows(me, [
+            ("OUSD", ousd, c18),
+            ("USDT", usdt, c6),
+            ("USDC", usdc, c6),
+            ("DAI", dai, c18),
+            ("3CRV(token)", threepool_lp, c18),
+        ]) + [
+            observe_row("3CRV price", (threepool_swap.get_virtual_price, []), c6),
+            observe_row("3CRV($value)", lambda v: v["3CRV price"] * v["3CRV(token)"] // 10**18),
+            observe_row("Total", lambda v: v["OUSD"] + v["USDT"] * 10**12 + v["USDC"] * 10**12 + v["DAI"] + v["3CRV($value)"]),
+        ])
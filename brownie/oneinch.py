@@ -4,11 +4,15 @@ from types import SimpleNamespace
 import os
 import json
 import time
+import hashlib
 
 from prices import decimalsMap 
 
 ONEINCH_API_KEY = os.getenv('ONEINCH_API_KEY')
 ONEINCH_SWAP_VERSION = "5.2"
+# When set, every swap payload returned by the API is saved in this directory.
+# Used to build the corpus for `scripts/oneinch_decoder_benchmark.py`
+ONEINCH_PAYLOAD_DIR = os.getenv('ONEINCH_PAYLOAD_DIR')
 
 def get_1inch_price(from_token, to_token, retry_on_ratelimit=True):
   if len(ONEINCH_API_KEY) <= 0:
@@ -101,4 +105,11 @@ def get_1inch_swap_data(from_token, to_token, swap_amount, slippage, from_addres
 
   print(result)
 
+  if ONEINCH_PAYLOAD_DIR:
+    os.makedirs(ONEINCH_PAYLOAD_DIR, exist_ok=True)
+    # Chunked swaps fetch several payloads a second, the calldata hash keeps them apart
+    payload_hash = hashlib.sha256(result['tx']['data'].encode()).hexdigest()[:12]
+    with open(os.path.join(ONEINCH_PAYLOAD_DIR, "%s_%s_%d_%s.json" % (from_token, to_token, int(time.time()), payload_hash)), 'w') as f:
+      json.dump({'params': params, 'tx': result['tx']}, f)
+
   return SimpleNamespace(receiver = result['tx']['to'], input = result['tx']['data'])
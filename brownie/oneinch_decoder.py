@@ -0,0 +1,146 @@
+from collections import namedtuple
+import json
+import os
+import eth_abi
+from eth_utils import function_signature_to_4byte_selector
+
+from abi_types import split_types, is_dynamic, abi_input_type, strip_names, decode_arguments
+
+# Decodes 1inch router calldata without a brownie contract. The dispatch table
+# is built once, keyed by the 4 byte selector, and covers every v5 (from the
+# router ABI in abi/) and v6 router entry point.
+
+ROUTER_1INCH_V5_ABI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'abi', 'router_1inch_v5.json')
+
+# AggregationRouterV6 entry points. `Address` arguments are plain uint256 in the ABI
+ROUTER_1INCH_V6_FUNCTIONS = [
+    "swap(address executor,(address srcToken,address dstToken,address srcReceiver,address dstReceiver,uint256 amount,uint256 minReturnAmount,uint256 flags) desc,bytes data)",
+    "unoswap(uint256 token,uint256 amount,uint256 minReturn,uint256 dex)",
+    "unoswap2(uint256 token,uint256 amount,uint256 minReturn,uint256 dex,uint256 dex2)",
+    "unoswap3(uint256 token,uint256 amount,uint256 minReturn,uint256 dex,uint256 dex2,uint256 dex3)",
+    "unoswapTo(uint256 to,uint256 token,uint256 amount,uint256 minReturn,uint256 dex)",
+    "unoswapTo2(uint256 to,uint256 token,uint256 amount,uint256 minReturn,uint256 dex,uint256 dex2)",
+    "unoswapTo3(uint256 to,uint256 token,uint256 amount,uint256 minReturn,uint256 dex,uint256 dex2,uint256 dex3)",
+    "ethUnoswap(uint256 minReturn,uint256 dex)",
+    "ethUnoswap2(uint256 minReturn,uint256 dex,uint256 dex2)",
+    "ethUnoswap3(uint256 minReturn,uint256 dex,uint256 dex2,uint256 dex3)",
+    "ethUnoswapTo(uint256 to,uint256 minReturn,uint256 dex)",
+    "ethUnoswapTo2(uint256 to,uint256 minReturn,uint256 dex,uint256 dex2)",
+    "ethUnoswapTo3(uint256 to,uint256 minReturn,uint256 dex,uint256 dex2,uint256 dex3)",
+    "clipperSwap(address clipperExchange,uint256 srcToken,address dstToken,uint256 inputAmount,uint256 outputAmount,uint256 goodUntil,bytes32 r,bytes32 vs)",
+    "clipperSwapTo(address clipperExchange,address recipient,uint256 srcToken,address dstToken,uint256 inputAmount,uint256 outputAmount,uint256 goodUntil,bytes32 r,bytes32 vs)",
+]
+
+# Functions the Swapper1InchV5 contract accepts and the arguments it needs
+SWAPPER_SWAP_FUNCTIONS = ("swap",)
+SWAPPER_POOLS_FUNCTIONS = ("unoswapTo", "uniswapV3SwapTo")
+
+# `heads` is the byte offset of every argument's head word, after the selector
+Entry = namedtuple('Entry', ['version', 'name', 'signature', 'types', 'names', 'heads'])
+
+# Size of the head of an argument: dynamic types only take an offset word
+def head_size(abi_type):
+    if is_dynamic(abi_type):
+        return 32
+    if abi_type.endswith(']'):
+        length = int(abi_type[abi_type.rindex('[') + 1:-1])
+        return length * head_size(abi_type[:abi_type.rindex('[')])
+    if abi_type.startswith('('):
+        return sum([head_size(t) for t in split_types(abi_type[1:-1])])
+    return 32
+
+def make_entry(version, name, types, names):
+    signature = "{}({})".format(name, ",".join(types))
+    heads = []
+    offset = 0
+    for abi_type in types:
+        heads.append(offset)
+        offset += head_size(abi_type)
+    return Entry(version, name, signature, types, names, heads)
+
+def build_dispatch_table():
+    table = {}
+
+    with open(ROUTER_1INCH_V5_ABI, 'r') as f:
+        for item in json.load(f):
+            if item.get('type') != 'function' or item.get('stateMutability') == 'view':
+                continue
+            entry = make_entry(
+                'v5',
+                item['name'],
+                [abi_input_type(i) for i in item['inputs']],
+                [i['name'] for i in item['inputs']]
+            )
+            table[function_signature_to_4byte_selector(entry.signature)] = entry
+
+    for function in ROUTER_1INCH_V6_FUNCTIONS:
+        name = function[:function.index('(')]
+        args = split_types(function[len(name) + 1:-1])
+        entry = make_entry('v6', name, [strip_names(arg) for arg in args], [arg.rsplit(' ', 1)[1] for arg in args])
+        table[function_signature_to_4byte_selector(entry.signature)] = entry
+
+    return table
+
+DISPATCH_TABLE = build_dispatch_table()
+
+def to_view(calldata):
+    if isinstance(calldata, str):
+        calldata = bytes.fromhex(calldata[2:] if calldata.startswith('0x') else calldata)
+    return memoryview(calldata)
+
+def lookup(calldata):
+    view = to_view(calldata)
+    selector = bytes(view[:4])
+    if selector not in DISPATCH_TABLE:
+        raise Exception("Unrecognized 1Inch swap selector 0x{}".format(selector.hex()))
+    return view, DISPATCH_TABLE[selector]
+
+# Read a single argument straight out of the calldata, without decoding the rest
+def read_argument(calldata, name):
+    view, entry = lookup(calldata)
+    index = entry.names.index(name)
+    abi_type = entry.types[index]
+    args = view[4:]
+    word = args[entry.heads[index]:entry.heads[index] + 32]
+
+    if abi_type == 'address':
+        return '0x' + word[12:].hex()
+    if abi_type in ('uint256', 'uint8', 'bytes32'):
+        return int.from_bytes(word, 'big') if abi_type.startswith('uint') else bytes(word)
+    if abi_type == 'bytes':
+        start = int.from_bytes(word, 'big')
+        length = int.from_bytes(args[start:start + 32], 'big')
+        return args[start + 32:start + 32 + length]
+    if abi_type == 'uint256[]':
+        start = int.from_bytes(word, 'big')
+        length = int.from_bytes(args[start:start + 32], 'big')
+        return [
+            int.from_bytes(args[start + 32 * (i + 1):start + 32 * (i + 2)], 'big')
+            for i in range(length)
+        ]
+    return decode(calldata)[1][name]
+
+# Full decode of the calldata with the cached decoder of its entry. Returns
+# (entry, {argument name: value})
+def decode(calldata):
+    view, entry = lookup(calldata)
+    values = decode_arguments(entry.signature, view, 4)
+    return entry, dict(zip(entry.names, values))
+
+# Re-encode 1inch calldata into the `data` argument the Swapper1InchV5 expects
+def swapper_data(calldata):
+    view, entry = lookup(calldata)
+    selector = bytes(view[:4])
+
+    if entry.version == 'v5' and entry.name in SWAPPER_SWAP_FUNCTIONS:
+        return '0x' + eth_abi.encode_abi(
+            ['bytes4', 'address', 'bytes'],
+            [selector, read_argument(view, 'executor'), bytes(read_argument(view, 'data'))]
+        ).hex()
+    elif entry.version == 'v5' and entry.name in SWAPPER_POOLS_FUNCTIONS:
+        return '0x' + eth_abi.encode_abi(
+            ['bytes4', 'uint256[]'],
+            [selector, read_argument(view, 'pools')]
+        ).hex()
+
+    raise Exception("1Inch swap function {} ({} 0x{}) is not supported by the swapper".format(entry.signature, entry.version, selector.hex()))
@@ -1,6 +1,8 @@
 
 import os
 import requests
+import numpy as np
+from types import SimpleNamespace
 
 from world import *
 
@@ -131,13 +133,61 @@ def get_uniswap_v3_quote(path, amount):
         amount,
     )
 
-def get_uniswap_v3_price(path, amount):
+def get_uniswap_v3_price(path, amount=10**18):
     _, prices_after, _, _ = uniswap_v3_quoter.quoteExactOutput.call(
         path,
-        1e18,
+        amount,
     )
 
-    return parse_uniswap_x96_price(prices_after[len(prices_after - 1)])
+    return parse_uniswap_x96_price(prices_after[-1])
+
+# Quote many (path, amount) pairs with quoteExactInput in a single Multicall round trip.
+# Returns NumPy arrays, one row per pair. Amounts and sqrt prices are kept as python
+# ints (object arrays) so they don't overflow. Per hop values are padded with 0 up to
+# the longest path; `ok` is False for quotes that reverted.
+def get_uniswap_v3_quotes(pairs, block_identifier=None, batch_size=50):
+    results = multicall(
+        [(uniswap_v3_quoter.quoteExactInput, [path, amount]) for path, amount in pairs],
+        block_identifier,
+        batch_size
+    )
+    hops = max([len(r[1]) for r in results if r is not None], default=1)
+
+    ok = np.zeros(len(pairs), dtype=bool)
+    amounts_out = np.zeros(len(pairs), dtype=object)
+    gas_estimates = np.zeros(len(pairs), dtype=np.int64)
+    sqrt_prices_after = np.zeros((len(pairs), hops), dtype=object)
+    ticks_crossed = np.zeros((len(pairs), hops), dtype=np.int64)
+
+    for i, result in enumerate(results):
+        if result is None:
+            continue
+        amount_out, sqrt_prices, ticks, gas_estimate = result
+        ok[i] = True
+        amounts_out[i] = int(amount_out)
+        gas_estimates[i] = gas_estimate
+        sqrt_prices_after[i, :len(sqrt_prices)] = [int(x) for x in sqrt_prices]
+        ticks_crossed[i, :len(ticks)] = ticks
+
+    return SimpleNamespace(
+        ok=ok,
+        amounts_out=amounts_out,
+        sqrt_prices_after=sqrt_prices_after,
+        ticks_crossed=ticks_crossed,
+        gas_estimates=gas_estimates,
+    )
+
+# Quote every path at every amount. Arrays of the result are shaped (paths, amounts, ...)
+def get_uniswap_v3_quote_grid(paths, amounts, block_identifier=None):
+    quotes = get_uniswap_v3_quotes([(path, amount) for path in paths for amount in amounts], block_identifier)
+    shape = (len(paths), len(amounts))
+    return SimpleNamespace(
+        ok=quotes.ok.reshape(shape),
+        amounts_out=quotes.amounts_out.reshape(shape),
+        sqrt_prices_after=quotes.sqrt_prices_after.reshape(shape + quotes.sqrt_prices_after.shape[1:]),
+        ticks_crossed=quotes.ticks_crossed.reshape(shape + quotes.ticks_crossed.shape[1:]),
+        gas_estimates=quotes.gas_estimates.reshape(shape),
+    )
 
 def parse_uniswap_x96_price(amount):
     return (amount / (2 ** 96)) ** 2
\ No newline at end of file
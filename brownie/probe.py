@@ -0,0 +1,87 @@
+from world_abstract import *
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+# Pre-flight checks for candidate transactions. Every candidate is run with
+# eth_call (and optionally eth_estimateGas) against the same pinned block, all
+# at once, so nothing is sent and the fork state is untouched.
+#
+#   calls = [probe_call(vault_admin.withdrawFromStrategy, [strat, [WETH], [amount]], STRATEGIST) for amount in amounts]
+#   results = probe(calls)
+#   max_amount, _ = find_max_amount(lambda amount: probe_call(..., [amount], STRATEGIST), 0, 10_000 * 10**18)
+
+Call = namedtuple('Call', ['target', 'data', 'sender', 'value'])
+PROBE_MAX_WORKERS = 16
+
+def probe_call(fn, args, sender, value=0):
+    return Call(fn._address, fn.encode_input(*args), sender, value)
+
+# Revert data hides in different places depending on the node and web3 version
+def revert_data(exception):
+    for arg in exception.args:
+        data = arg
+        while isinstance(data, dict):
+            data = data.get('data')
+        if isinstance(data, str) and data.startswith('0x'):
+            return data
+        if isinstance(data, str) and 'execution reverted: ' in data:
+            return None
+    return None
+
+def revert_reason(exception):
+    data = revert_data(exception)
+    if data is not None:
+        return decode_revert_reason(bytes.fromhex(data[2:]))
+    message = str(exception)
+    return message.split('execution reverted: ')[-1] if 'execution reverted' in message else message
+
+def probe_one(call, block_identifier, estimate_gas):
+    tx = {'from': call.sender, 'to': call.target, 'data': call.data, 'value': call.value}
+    try:
+        return_data = brownie.web3.eth.call(tx, block_identifier)
+        gas = brownie.web3.eth.estimate_gas(tx, block_identifier) if estimate_gas else None
+        return SimpleNamespace(success=True, gas=gas, return_data=return_data, reason=None)
+    except Exception as e:
+        return SimpleNamespace(success=False, gas=None, return_data=None, reason=revert_reason(e))
+
+# Run every candidate call concurrently against one block (the latest by default).
+# Returns success, gas, return data and revert reason for each call, in order.
+def probe(calls, block_identifier=None, estimate_gas=True, max_workers=PROBE_MAX_WORKERS):
+    if block_identifier is None:
+        block_identifier = brownie.web3.eth.block_number
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda call: probe_one(call, block_identifier, estimate_gas), calls))
+
+# Largest amount in [low, high] for which make_call(amount) doesn't revert,
+# assuming every amount below a working one works too. Each round probes `k`
+# amounts in parallel and narrows the range to the gap between the last
+# success and the first failure, until it is under `precision`.
+# Returns (amount or None if even `low` fails, number of probes)
+def find_max_amount(make_call, low, high, precision=1, k=8, block_identifier=None):
+    if block_identifier is None:
+        block_identifier = brownie.web3.eth.block_number
+    probes = 0
+
+    results = probe([make_call(low), make_call(high)], block_identifier, estimate_gas=False)
+    probes += 2
+    if not results[0].success:
+        return None, probes
+    if results[1].success:
+        return high, probes
+
+    while high - low > precision:
+        step = (high - low) / (k + 1)
+        amounts = sorted(set([int(low + step * (i + 1)) for i in range(k)]) - set([low, high]))
+        if not amounts:
+            break
+        results = probe([make_call(amount) for amount in amounts], block_identifier, estimate_gas=False)
+        probes += len(amounts)
+        for amount, result in zip(amounts, results):
+            if result.success:
+                low = amount
+            else:
+                high = amount
+                break
+    return low, probes
@@ -0,0 +1,121 @@
+from world import *
+from event_indexer import index_events, query
+
+import os
+
+# Status of the latest proposals on every governor, read in one Multicall.
+# Proposals that can't change anymore (executed, expired, canceled, defeated)
+# are cached on disk for good, so only live proposals are fetched again.
+#
+# The OpenZeppelin based governors have no proposal counter, their proposal
+# ids come from ProposalCreated events indexed into the local event database.
+
+PROPOSAL_CACHE = os.getenv('PROPOSAL_CACHE', 'proposal_cache.json')
+# Before the first OpenZeppelin governor was deployed
+OZ_GOVERNOR_START_BLOCK = 15_000_000
+
+LEGACY_STATES = ['New', 'Queue', 'Expired', 'Executed']
+OZ_STATES = ['Pending', 'Active', 'Canceled', 'Defeated', 'Succeeded', 'Queued', 'Expired', 'Executed']
+FINAL_STATES = ['Expired', 'Executed', 'Canceled', 'Defeated']
+
+GOVERNORS = {
+    'governor': governor,
+    'governor_five': governor_five,
+    'governor_six': governor_six,
+}
+
+STATE_ICONS = {
+    'New': '🎀', 'Pending': '🎀', 'Active': '🗳 ', 'Succeeded': '👍',
+    'Queue': '📅', 'Queued': '📅', 'Expired': '💀', 'Canceled': '🚫',
+    'Defeated': '👎', 'Executed': '✅',
+}
+
+def load_proposal_cache():
+    if not os.path.exists(PROPOSAL_CACHE):
+        return {}
+    with open(PROPOSAL_CACHE, 'r') as f:
+        return json.load(f)
+
+def save_proposal_cache(cache):
+    with open(PROPOSAL_CACHE, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+# Ids of the latest n proposals of a governor, newest first
+def latest_proposal_ids(name, n):
+    if name == 'governor':
+        count = governor.proposalCount()
+        return [str(id) for id in range(count, max(count - n, 0), -1)]
+
+    contract = GOVERNORS[name]
+    index_events(name, [contract.address], OZ_GOVERNOR_START_BLOCK, event_names=['ProposalCreated'])
+    rows = query(
+        "SELECT args FROM logs WHERE chain_id = ? AND event = 'ProposalCreated' AND lower(address) = ? ORDER BY block DESC LIMIT ?",
+        (brownie.chain.id, contract.address.lower(), n)
+    )
+    return [json.loads(args)['proposalId'] for args in rows['args']]
+
+def proposal_calls(name, id):
+    contract = GOVERNORS[name]
+    eta = (contract.proposals, [id]) if name == 'governor' else (contract.proposalEta, [id])
+    return [(contract.state, [id]), eta, (contract.getActions, [id])]
+
+def proposal_record(name, id, state, eta, actions):
+    if name == 'governor':
+        state = LEGACY_STATES[state]
+        eta = eta[2]
+        targets, signatures, _ = actions
+        values = [0] * len(targets)
+    else:
+        state = OZ_STATES[state]
+        targets, values, signatures, _ = actions
+    return {
+        'governor': name,
+        'id': id,
+        'state': state,
+        'eta': int(eta),
+        'actions': [[str(t), int(v), str(s)] for t, v, s in zip(targets, values, signatures)],
+    }
+
+# Fetch the latest n proposals of every governor. Returns a list of dicts
+def fetch_proposals(n=3, governors=GOVERNORS.keys()):
+    cache = load_proposal_cache()
+    ids = [(name, id) for name in governors for id in latest_proposal_ids(name, n)]
+    missing = [(name, id) for name, id in ids if id not in cache.get(name, {})]
+
+    calls = []
+    for name, id in missing:
+        calls += proposal_calls(name, int(id))
+    results = multicall(calls) if calls else []
+
+    for i, (name, id) in enumerate(missing):
+        state, eta, actions = results[i * 3:i * 3 + 3]
+        if state is None:
+            # Unknown proposal id
+            continue
+        record = proposal_record(name, id, state, eta, actions)
+        cache.setdefault(name, {})[id] = record
+    save_proposal_cache({
+        name: {id: r for id, r in records.items() if r['state'] in FINAL_STATES}
+        for name, records in cache.items()
+    })
+
+    return [cache[name][id] for name, id in ids if id in cache.get(name, {})]
+
+def show_proposal_status(record):
+    icon = STATE_ICONS.get(record['state'], '❔')
+    status = "{} {} #{} [{}] {} actions".format(icon, record['governor'], record['id'], record['state'], len(record['actions']))
+    if record['state'] in ('Queue', 'Queued'):
+        remaining_hours = (record['eta'] - time.time()) / 60 / 60
+        if remaining_hours > 0:
+            status += " with {:.2f} hours remaining in timelock".format(remaining_hours)
+        else:
+            status += " ready to execute"
+    print(status)
+    for target, value, signature in record['actions']:
+        print("      {} {}{}".format(nice_contract_address(target), signature, " + {} ETH".format(value / 1e18) if value else ""))
+
+def show_dashboard(n=3, governors=GOVERNORS.keys()):
+    records = fetch_proposals(n, governors)
+    for record in records:
+        show_proposal_status(record)
+    return records
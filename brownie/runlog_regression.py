@@ -0,0 +1,213 @@
+from cross_chain import CHAINS, rpc_url
+from runlog_runner import parse_runlog
+
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import glob
+import json
+import os
+import queue
+import re
+import socket
+import subprocess
+import tempfile
+import time
+import web3
+
+# Replays runlog blocks at the block they were originally run against and
+# compares the calldata they produce with a stored golden copy, to catch ABI
+# drift in abi/ and regressions in the world helpers.
+#
+# Every block gets a fresh anvil fork (anvil caches the forked state on disk,
+# so replays at the same block are fast), and several forks run in parallel.
+# The replay itself runs through brownie, attached to one of the forks through
+# the `runlog-fork-<n>` development networks, added once with:
+#
+#   brownie networks add Development runlog-fork-0 host=http://127.0.0.1 port=8600 cmd=anvil
+#   brownie networks add Development runlog-fork-1 host=http://127.0.0.1 port=8601 cmd=anvil
+#   ...
+#
+#   python -c "from runlog_regression import *; run_regression('runlogs/2024_09_strategist.py')"
+#
+# A block can pin its fork block with a `# fork block: 20680000` comment,
+# otherwise the start of the day in its header is used.
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'runlogs', 'golden')
+FORK_BLOCK_CACHE = os.path.join(GOLDEN_DIR, 'fork_blocks.json')
+FORK_BLOCK = re.compile(r'#\s*fork[ _]block\s*[:=]\s*([0-9_]+)', re.I)
+FORK_BASE_PORT = 8600
+REGRESSION_WORKERS = 4
+FORK_STARTUP_TIMEOUT = 60
+
+WORLD_CHAINS = {
+    'world_base': 'base',
+    'world_sonic': 'sonic',
+    'world_plume': 'plume',
+}
+
+def block_chain(block):
+    for module, chain in WORLD_CHAINS.items():
+        if re.search(r'^from {} import'.format(module), block.source, re.M):
+            return chain
+    return 'mainnet'
+
+# First block at or after `timestamp`, by binary search over block timestamps
+def block_at_timestamp(w3, timestamp):
+    low, high = 1, w3.eth.block_number
+    while low < high:
+        mid = (low + high) // 2
+        if w3.eth.get_block(mid)['timestamp'] < timestamp:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+def load_fork_blocks():
+    if not os.path.exists(FORK_BLOCK_CACHE):
+        return {}
+    with open(FORK_BLOCK_CACHE, 'r') as f:
+        return json.load(f)
+
+# Block number each runlog block forks from. Dates are looked up once and cached
+def fork_block(block, chain, fork_blocks):
+    declared = FORK_BLOCK.search(block.source)
+    if declared:
+        return int(declared.group(1).replace('_', ''))
+    if block.date is None:
+        return None
+
+    key = "{}:{}".format(chain, block.date.isoformat())
+    if key not in fork_blocks:
+        w3 = web3.Web3(web3.HTTPProvider(rpc_url(chain)))
+        start_of_day = datetime.datetime.combine(block.date, datetime.time(), tzinfo=datetime.timezone.utc)
+        fork_blocks[key] = block_at_timestamp(w3, int(start_of_day.timestamp()))
+    return fork_blocks[key]
+
+def golden_path(path, number):
+    return os.path.join(GOLDEN_DIR, os.path.splitext(os.path.basename(path))[0], "{}.json".format(number))
+
+def wait_for_port(port):
+    deadline = time.time() + FORK_STARTUP_TIMEOUT
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise Exception("Fork on port {} did not start".format(port))
+
+# Output of a process written to a temporary file, for failure reports
+def process_output(f):
+    f.seek(0)
+    return f.read().decode('utf-8', 'replace')
+
+# Fork `chain` at `block_number` on the worker's port and replay one block on it
+def replay(path, block, chain, block_number, worker):
+    port = FORK_BASE_PORT + worker
+    with tempfile.TemporaryFile() as fork_log:
+        fork = subprocess.Popen(
+            ['anvil', '--fork-url', rpc_url(chain), '--fork-block-number', str(block_number), '--port', str(port), '--silent'],
+            stdout=fork_log, stderr=subprocess.STDOUT,
+        )
+        try:
+            try:
+                wait_for_port(port)
+            except Exception as e:
+                raise Exception("{}\n{}".format(e, process_output(fork_log)))
+            with tempfile.NamedTemporaryFile(suffix='.json') as out:
+                env = dict(os.environ, RUNLOG_PATH=path, RUNLOG_BLOCK=str(block.number), RUNLOG_OUT=out.name)
+                run = subprocess.run(
+                    ['brownie', 'run', 'scripts/runlog_replay.py', '--network', 'runlog-fork-{}'.format(worker)],
+                    env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                )
+                with open(out.name, 'r') as f:
+                    content = f.read()
+                if content == '':
+                    output = run.stdout.decode('utf-8', 'replace')
+                    return {'success': False, 'error': "Replay crashed (exit code {})\n{}".format(run.returncode, output), 'txs': []}
+                return json.loads(content)
+        finally:
+            fork.terminate()
+            fork.wait()
+
+def compare(golden, result):
+    if not result['success']:
+        return "failed: " + ((result['error'] or "").strip().splitlines() or ["reverted"])[-1]
+    if len(golden['txs']) != len(result['txs']):
+        return "{} txs, golden has {}".format(len(result['txs']), len(golden['txs']))
+    for i, (expected, actual) in enumerate(zip(golden['txs'], result['txs'])):
+        for field in ['to', 'value', 'data']:
+            if expected[field].lower() != actual[field].lower():
+                return "tx {} {} differs".format(i + 1, field)
+    return None
+
+# Replay the blocks of one or more runlog files (glob patterns work) and compare
+# them with their golden calldata. update=True (re)writes the golden files,
+# without it a block with no golden file counts as a regression.
+def run_regression(paths, blocks=None, update=False, workers=REGRESSION_WORKERS):
+    if isinstance(paths, str):
+        paths = sorted(glob.glob(paths))
+    fork_blocks = load_fork_blocks()
+
+    jobs = []
+    for path in paths:
+        for block in parse_runlog(path):
+            if blocks is not None and block.number not in blocks:
+                continue
+            chain = block_chain(block)
+            if rpc_url(chain) is None:
+                print("{}#{} skipped: no RPC URL for {} ({})".format(path, block.number, chain, CHAINS[chain].rpc_env))
+                continue
+            block_number = fork_block(block, chain, fork_blocks)
+            if block_number is None:
+                print("{}#{} skipped: no date or fork block".format(path, block.number))
+                continue
+            jobs.append((path, block, chain, block_number))
+
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with open(FORK_BLOCK_CACHE, 'w') as f:
+        json.dump(fork_blocks, f, indent=2, sort_keys=True)
+
+    free_workers = queue.Queue()
+    for worker in range(workers):
+        free_workers.put(worker)
+
+    def run_job(job):
+        path, block, chain, block_number = job
+        worker = free_workers.get()
+        try:
+            return replay(path, block, chain, block_number, worker)
+        except Exception as e:
+            # e.g. anvil didn't start, report it with the other blocks
+            return {'success': False, 'error': "{}: {}".format(type(e).__name__, e), 'txs': []}
+        finally:
+            free_workers.put(worker)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_job, jobs))
+
+    failures = []
+    for (path, block, chain, block_number), result in zip(jobs, results):
+        golden_file = golden_path(path, block.number)
+        if update and result['success']:
+            os.makedirs(os.path.dirname(golden_file), exist_ok=True)
+            with open(golden_file, 'w') as f:
+                json.dump({'chain': chain, 'fork_block': block_number, 'txs': result['txs']}, f, indent=2)
+            status = "updated"
+        elif not os.path.exists(golden_file):
+            status = "no golden output, run with update=True" if result['success'] else compare({}, result)
+        else:
+            with open(golden_file, 'r') as f:
+                status = compare(json.load(f), result) or "ok"
+        if status not in ("ok", "updated"):
+            failures.append((path, block, result))
+        print("{}#{:<3} {:<8} {:>10}  {}  {}".format(os.path.basename(path), block.number, chain, block_number, status, block.title[:50]))
+
+    for path, block, result in failures:
+        if not result['success'] and result['error']:
+            print("---- {}#{}".format(os.path.basename(path), block.number))
+            print(result['error'].rstrip())
+
+    print("{} of {} blocks regressed".format(len(failures), len(jobs)))
+    return len(failures)
@@ -0,0 +1,152 @@
+from world_abstract import *
+from abi_types import decode_arguments
+
+from contextlib import nullcontext
+from eth_utils import function_signature_to_4byte_selector
+from types import SimpleNamespace
+import datetime
+import io
+import os
+import traceback
+
+# Runs every `def main()` block of a runlog file on one fork. Each block runs
+# in its own snapshot, so blocks don't see each other's changes, and gets a
+# report of the transactions it sent, their gas and the profit / vault change
+# it passed to `vault_value_checker.checkDelta`.
+#
+#   brownie console --network hardhat
+#   >>> from runlog_runner import *
+#   >>> reports = run_runlog("runlogs/2024_09_strategist.py")
+
+HEADER = re.compile(r'^# ?-{3,}[ \t]*\n# ?(.+)\n# ?-{3,}[ \t]*$', re.M)
+DEF_MAIN = re.compile(r'^def main\(\):', re.M)
+HEADER_DATE = re.compile(r'([A-Za-z]{3})[a-z]*\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})')
+CHECK_DELTA_SIGNATURE = 'checkDelta(int256,int256,int256,int256)'
+CHECK_DELTA_SELECTOR = function_signature_to_4byte_selector(CHECK_DELTA_SIGNATURE)
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+def parse_header_date(title):
+    m = HEADER_DATE.search(title)
+    if not m or m.group(1).lower() not in MONTHS:
+        return None
+    try:
+        return datetime.date(int(m.group(3)), MONTHS.index(m.group(1).lower()) + 1, int(m.group(2)))
+    except ValueError:
+        return None
+
+def import_lines(source):
+    return "".join([line for line in source.splitlines(True) if line.startswith('from ') or line.startswith('import ')])
+
+# Split a runlog into blocks, one per `def main()`. Returns a list of namespaces
+# with the block number, header title and date, first line number and source.
+def parse_runlog(path):
+    with open(path, 'r') as f:
+        source = f.read()
+
+    headers = list(HEADER.finditer(source))
+    starts = [0] + [h.start() for h in headers] + [len(source)]
+    blocks = []
+    for start, end in zip(starts[:-1], starts[1:]):
+        segment = source[start:end]
+        header = HEADER.match(segment)
+        title = header.group(1).strip() if header else ""
+        mains = [m.start() for m in DEF_MAIN.finditer(segment)]
+        if not mains:
+            continue
+        # Blocks after the first one in a segment share the segment's imports
+        cuts = [0] + mains[1:] + [len(segment)]
+        for i, (a, b) in enumerate(zip(cuts[:-1], cuts[1:])):
+            imports = "" if i == 0 else import_lines(segment[:mains[0]])
+            blocks.append(SimpleNamespace(
+                number=len(blocks) + 1,
+                title=title,
+                date=parse_header_date(title),
+                line=source[:start + a].count('\n') + 1,
+                imports=imports,
+                source=imports + segment[a:b],
+            ))
+    return blocks
+
+def check_delta_values(tx):
+    data = bytes.fromhex(str(tx.input)[2:])
+    if data[:4] != CHECK_DELTA_SELECTOR:
+        return None
+    profit, profit_variance, vault_change, vault_change_variance = decode_arguments(CHECK_DELTA_SIGNATURE, data[4:])
+    return SimpleNamespace(
+        profit=profit,
+        profit_variance=profit_variance,
+        vault_change=vault_change,
+        vault_change_variance=vault_change_variance,
+    )
+
+# Run one block in a snapshot. The block's own TemporaryFork reverts its
+# transactions out of brownie.history, so they are collected on every revert.
+# The block's snapshot is a raw node snapshot, brownie.chain.snapshot() only
+# holds one and the block's TemporaryFork replaces it.
+def run_block(block, path="<runlog>", quiet=True):
+    collected = []
+    chain = brownie.chain
+    history_start = len(brownie.history)
+    original_revert = chain.revert
+
+    def collecting_revert():
+        collected.extend([tx for tx in brownie.history[history_start:] if tx not in collected])
+        return original_revert()
+
+    output = io.StringIO()
+    error = None
+    snapshot_id = evm_snapshot()
+    chain.revert = collecting_revert
+    try:
+        namespace = {'__name__': '__runlog__'}
+        with redirect_stdout(output) if quiet else nullcontext():
+            # Pad between the shared imports and the block so tracebacks point
+            # at the line in the runlog file
+            body = block.source[len(block.imports):]
+            padding = "\n" * (block.line - 1 - block.imports.count('\n'))
+            exec(compile(block.imports + padding + body, path, 'exec'), namespace)
+            namespace['main']()
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        del chain.revert
+        collected.extend([tx for tx in brownie.history[history_start:] if tx not in collected])
+        evm_revert(snapshot_id)
+
+    checks = [c for c in [check_delta_values(tx) for tx in collected] if c is not None]
+    return SimpleNamespace(
+        number=block.number,
+        title=block.title,
+        date=block.date,
+        line=block.line,
+        success=error is None and all([tx.status == 1 for tx in collected]),
+        error=error,
+        txs=[SimpleNamespace(receiver=tx.receiver, value=tx.value, input=tx.input, fn_name=tx.fn_name, gas_used=tx.gas_used, status=tx.status) for tx in collected],
+        gas_used=sum([tx.gas_used for tx in collected]),
+        profit=checks[-1].profit if checks else None,
+        vault_change=checks[-1].vault_change if checks else None,
+        output=output.getvalue(),
+    )
+
+def show_block_report(report):
+    status = "ok" if report.success else "FAILED"
+    profit = c18(report.profit) if report.profit is not None else leading_whitespace("-")
+    vault_change = c18(report.vault_change) if report.vault_change is not None else leading_whitespace("-")
+    print("{:>3} {:<7} {:>4} txs {:>12,} gas  profit {} vault change {}  {}".format(
+        report.number, status, len(report.txs), report.gas_used, profit, vault_change, report.title[:60]
+    ))
+    if report.error:
+        print("      " + report.error.strip().splitlines()[-1])
+
+# Run the given blocks (all by default) of a runlog file on the connected fork
+def run_runlog(path, blocks=None, quiet=True):
+    parsed = parse_runlog(path)
+    reports = []
+    for block in parsed:
+        if blocks is not None and block.number not in blocks:
+            continue
+        report = run_block(block, path, quiet)
+        show_block_report(report)
+        reports.append(report)
+    print("{} of {} blocks ok".format(len([r for r in reports if r.success]), len(reports)))
+    return reports
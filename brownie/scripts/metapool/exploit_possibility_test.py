@@ -32,17 +32,14 @@ def main():
         # tiltMetapoolTo3CRV(ousd_metapool)
         # Option 3
         # tiltMetapoolToMainCoin(ousd_metapool, 5*1e6*1e18)
-        with AccountOUSDBalance(OPTS):
-            with SupplyChanges(OPTS):
-                with ObserveMeBalances(OPTS):
-                    with MetapoolBalances(OPTS, ousd_metapool):
-                        with Crv3Balances(OPTS):
-                            for x in range(3):
-                                mint(10e6)
-                                withdrawAllFromMeta(OUSD_META_STRATEGY)
-                                redeem(10e6)
-                            show_vault_holdings()
-                            balance_metapool(ousd_metapool)
+        # one read of all observed values before and one after
+        with observe_all(Crv3Balances(OPTS), MetapoolBalances(OPTS, ousd_metapool), ObserveMeBalances(OPTS), SupplyChanges(OPTS), AccountOUSDBalance(OPTS)):
+            for x in range(3):
+                mint(10e6)
+                withdrawAllFromMeta(OUSD_META_STRATEGY)
+                redeem(10e6)
+            show_vault_holdings()
+            balance_metapool(ousd_metapool)
 
 
 
@@ -65,23 +62,20 @@ def main():
     # importantly in all cases the vault and OUSD total supply are ok and have not diverged
     with TemporaryFork():
         balance_metapool(ousd_metapool)
-        with AccountOUSDBalance(OPTS):
-            with SupplyChanges(OPTS):
-                with ObserveMeBalances(OPTS):
-                    with MetapoolBalances(OPTS, ousd_metapool):
-                        with Crv3Balances(OPTS):
-                            for x in range(15):
-                                mint(10e6)
-                                # Option 1
-                                balance_metapool(ousd_metapool)
-                                # Option 2
-                                # tiltMetapoolTo3CRV(ousd_metapool, 5*1e6*1e18)
-                                # Option 3
-                                # tiltMetapoolToMainCoin(ousd_metapool, 5*1e6*1e18)
-                                withdrawAllFromMeta(OUSD_META_STRATEGY)
-                                redeem(10e6)
-                                balance_metapool(ousd_metapool)
-                            show_vault_holdings()
+        # one read of all observed values before and one after
+        with observe_all(Crv3Balances(OPTS), MetapoolBalances(OPTS, ousd_metapool), ObserveMeBalances(OPTS), SupplyChanges(OPTS), AccountOUSDBalance(OPTS)):
+            for x in range(15):
+                mint(10e6)
+                # Option 1
+                balance_metapool(ousd_metapool)
+                # Option 2
+                # tiltMetapoolTo3CRV(ousd_metapool, 5*1e6*1e18)
+                # Option 3
+                # tiltMetapoolToMainCoin(ousd_metapool, 5*1e6*1e18)
+                withdrawAllFromMeta(OUSD_META_STRATEGY)
+                redeem(10e6)
+                balance_metapool(ousd_metapool)
+            show_vault_holdings()
 
 
     with TemporaryFork():
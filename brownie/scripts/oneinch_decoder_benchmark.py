@@ -0,0 +1,74 @@
+import glob
+import json
+import os
+import time
+import eth_abi
+
+from oneinch_decoder import *
+
+# Payloads saved by `get_1inch_swap_data` when ONEINCH_PAYLOAD_DIR is set. No
+# captured payloads are committed (they need a 1inch API key and go stale as
+# the router changes), so without a local capture only the synthetic corpus,
+# one max-size payload per known selector, is measured.
+PAYLOAD_DIR = os.getenv('ONEINCH_PAYLOAD_DIR', 'oneinch_payloads')
+ROUNDS = 2000
+
+def sample_value(abi_type):
+    if abi_type.endswith(']'):
+        inner = abi_type[:abi_type.rindex('[')]
+        length = abi_type[abi_type.rindex('[') + 1:-1]
+        return [sample_value(inner) for _ in range(int(length) if length else 3)]
+    if abi_type.startswith('('):
+        return tuple([sample_value(t) for t in split_types(abi_type[1:-1])])
+    if abi_type == 'address':
+        return '0x1111111254eeb25477b68fb85ed929f73a960582'
+    if abi_type == 'bool':
+        return True
+    if abi_type == 'bytes':
+        return os.urandom(1024)
+    if abi_type == 'string':
+        return 'benchmark'
+    if abi_type.startswith('bytes'):
+        return os.urandom(int(abi_type[5:]))
+    if abi_type.startswith('int'):
+        return -1
+    return 2 ** int(abi_type[4:] or 256) - 1
+
+def synthetic_corpus():
+    corpus = []
+    for selector, entry in DISPATCH_TABLE.items():
+        args = [sample_value(t) for t in entry.types]
+        corpus.append('0x' + (selector + eth_abi.encode_abi(entry.types, args)).hex())
+    return corpus
+
+def captured_corpus():
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(PAYLOAD_DIR, '*.json'))):
+        with open(path, 'r') as f:
+            corpus.append(json.load(f)['tx']['data'])
+    return corpus
+
+def bench(label, fn, corpus):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for calldata in corpus:
+            fn(calldata)
+    elapsed = time.perf_counter() - start
+    print("{:<36} {:>10.2f} us/payload".format(label, elapsed / (ROUNDS * len(corpus)) * 10**6))
+
+def swapper_payload(calldata):
+    try:
+        return swapper_data(calldata)
+    except Exception:
+        return None
+
+def main():
+    for name, corpus in [("synthetic", synthetic_corpus()), ("captured", captured_corpus())]:
+        if len(corpus) == 0:
+            print("No {} payloads in {}. Set ONEINCH_PAYLOAD_DIR and run some swaps to capture real ones".format(name, PAYLOAD_DIR))
+            continue
+
+        print("---- {} corpus: {} payloads ----".format(name, len(corpus)))
+        # Baseline: full decode after looking the function up by selector
+        bench("full eth_abi decode", decode, corpus)
+        bench("swapper data re-encode", swapper_payload, corpus)
@@ -0,0 +1,76 @@
+import glob
+import os
+import re
+import time
+
+import brownie
+from allocations import *
+
+# Replays every strategist vote found in the runlogs against the current
+# allocation. Each vote is executed on the fork twice, once the way the
+# runlogs did it with auto_consolidate_stables / auto_distribute_stables and
+# once as a `plan_rebalance` plan, reverting after each. Compares the number
+# of transactions, the gas they used and how many rows are still off target.
+RUNLOGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'runlogs', '*.py')
+TOLERANCE = 255_000
+CONSOLIDATION = "AAVE"
+AUTO_MIN_MOVE = 50_000
+
+def runlog_votes():
+    votes = []
+    for path in sorted(glob.glob(RUNLOGS)):
+        with open(path, 'r') as f:
+            for match in re.finditer(r'^[ \t]*votes = """(.*?)"""', f.read(), re.S | re.M):
+                votes.append((os.path.basename(path), match.group(1)))
+    return votes
+
+# Voted strategies that are unknown, or have funds but no row in the current
+# allocation
+def missing_strategies(allocation, votes):
+    rows = set(zip(allocation["strategy"], allocation["token"]))
+    return [
+        name for name, percent in parse_votes(votes)
+        if name != "Existing Allocation"
+        and (name not in SNAPSHOT_NAMES or (percent > 0 and tuple(SNAPSHOT_NAMES[name]) not in rows))
+    ]
+
+def rows_off_target(allocation):
+    current = load_from_blockchain()
+    off = (current["current_dollars"] - allocation["target_dollars"]).abs() >= TOLERANCE
+    return int(off.sum())
+
+# Tx count, gas used and rows off target after running `send`, then reverts
+def run_and_revert(allocation, send):
+    snapshot = world.evm_snapshot()
+    try:
+        txs = send()
+        return "{:>4} {:>11,} {:>4}".format(len(txs), sum([tx.gas_used for tx in txs]), rows_off_target(allocation))
+    except brownie.exceptions.VirtualMachineError as e:
+        return "reverted: {}".format(e.revert_msg)
+    finally:
+        world.evm_revert(snapshot)
+
+def auto_rebalance(allocation):
+    return auto_consolidate_stables(allocation, consolidation=CONSOLIDATION) + auto_distribute_stables(
+        allocation, consolidation=CONSOLIDATION, min_move=AUTO_MIN_MOVE
+    )
+
+def main():
+    base = load_from_blockchain()
+
+    print("{:<28} {:>4} {:>11} {:>4}   {:>4} {:>11} {:>4} {:>8}".format(
+        "runlog", "auto", "gas", "off", "plan", "gas", "off", "ms"
+    ))
+    for runlog, votes in runlog_votes():
+        missing = missing_strategies(base, votes)
+        if missing:
+            print("{:<28} skipped, no longer allocated to: {}".format(runlog, ", ".join(missing)))
+            continue
+        allocation = with_target_allocations(base, votes)
+
+        auto = run_and_revert(allocation, lambda: auto_rebalance(allocation))
+        start = time.perf_counter()
+        moves = plan_rebalance(allocation, tolerance=TOLERANCE)
+        elapsed = time.perf_counter() - start
+        plan = run_and_revert(allocation, lambda: execute_rebalance_plan(moves))
+        print("{:<28} {}   {} {:>8.1f}".format(runlog, auto, plan, elapsed * 1000))
@@ -0,0 +1,19 @@
+# Replays a single runlog block and saves the calldata it produced. Started by
+# `runlog_regression.py` against a local fork, configured through env variables.
+import json
+import os
+
+from runlog_runner import parse_runlog, run_block
+
+def main():
+    path = os.environ['RUNLOG_PATH']
+    number = int(os.environ['RUNLOG_BLOCK'])
+    block = [b for b in parse_runlog(path) if b.number == number][0]
+    report = run_block(block, path)
+
+    with open(os.environ['RUNLOG_OUT'], 'w') as f:
+        json.dump({
+            'success': report.success,
+            'error': report.error,
+            'txs': [{'to': str(tx.receiver), 'value': str(tx.value), 'data': str(tx.input)} for tx in report.txs],
+        }, f, indent=2)
@@ -3,8 +3,7 @@ from collateralSwap import *
 
 def main():
   with TemporaryForkForReallocations() as txs:
-    txs.append(vault_core.rebase({'from':MULTICHAIN_STRATEGIST}))
-    txs.append(vault_value_checker.takeSnapshot({'from':MULTICHAIN_STRATEGIST}))
+    txs.extend(ousd_value_check.take_snapshot())
     
     txs.append(
       vault_admin.setAssetDefaultStrategy(USDT, "0x0000000000000000000000000000000000000000", {'from': MULTICHAIN_STRATEGIST})
@@ -32,10 +31,7 @@ def main():
       )
     )
 
-    vault_change = vault_core.totalValue() - vault_value_checker.snapshots(MULTICHAIN_STRATEGIST)[0]
-    supply_change = ousd.totalSupply() - vault_value_checker.snapshots(MULTICHAIN_STRATEGIST)[1]
-    profit = vault_change - supply_change
-    txs.append(vault_value_checker.checkDelta(profit, (500 * 10**18), vault_change, (500 * 10**18), {'from': MULTICHAIN_STRATEGIST}))
+    txs.append(ousd_value_check.check_delta(500 * 10**18, 500 * 10**18))
 
   print("Schedule the following transactions on Gnosis Safe")
   for idx, item in enumerate(txs):
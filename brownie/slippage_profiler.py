@@ -0,0 +1,174 @@
+from collateralSwap import *
+
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import math
+import numpy as np
+import pandas as pd
+
+# Quoting more than a few sizes at once trips the 1inch API rate limit
+LADDER_MAX_WORKERS = 3
+# More chunks than this means the budget can't reasonably be met by chunking
+MAX_SWAP_CHUNKS = 20
+
+# quote a geometric ladder of swap sizes from 1 token of from_token up to from_amount
+# params:
+#   - steps -> number of sizes quoted (including the smallest and the full amount)
+#   - min_amount -> smallest size quoted. Defaults to 1 token of from_token
+#
+# Returns a DataFrame with the quote of every size and its price impact compared
+# to the smallest size (the smallest size is treated as the "no slippage" price).
+def quote_ladder(from_token, to_token, from_amount, steps=8, min_amount=None, protocols="", max_workers=LADDER_MAX_WORKERS):
+    if min_amount is None:
+        min_amount = scale_amount(WETH, from_token, 10**18) # 1 token of from_token (like 1WETH, 1DAI or 1USDT)
+
+    sizes = [int(x) for x in np.geomspace(min_amount, from_amount, steps)]
+    sizes[-1] = int(from_amount)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        quotes = list(executor.map(
+            lambda size: get_1inch_quote(from_token, to_token, size, protocols=protocols),
+            sizes
+        ))
+
+    ladder = pd.DataFrame({"size": sizes, "quote": quotes})
+    ladder["rate"] = ladder["quote"] / ladder["size"]
+    reference_rate = ladder["rate"].iloc[0]
+    # Same definition of slippage as `build_swap_tx`
+    ladder["impact"] = (ladder["size"] * reference_rate - ladder["quote"]) / ladder["quote"] * 100
+    ladder.attrs["reference_rate"] = reference_rate
+    return ladder
+
+# fit a power law `impact = a * size ^ b` (impact in percentage points) to the
+# quoted ladder. Sizes without a measurable impact are left out of the fit.
+def fit_price_impact(ladder):
+    measurable = ladder[ladder["impact"] > 0]
+    if len(measurable) == 0:
+        return 0.0, 1.0
+    if len(measurable) == 1:
+        # Not enough points for a curve, assume impact grows linearly with size
+        row = measurable.iloc[0]
+        return float(row["impact"]) / float(row["size"]), 1.0
+
+    # Sizes above 2**63 make object columns, fit on floats
+    b, log_a = np.polyfit(np.log(measurable["size"].astype(float)), np.log(measurable["impact"].astype(float)), 1)
+    # Price impact never shrinks with size
+    b = max(b, 1e-6)
+    return math.exp(log_a), b
+
+def expected_impact(fit, size):
+    a, b = fit
+    return a * float(size) ** b
+
+# expected output of a single swap of `size` on the fitted curve. Inverts the
+# impact definition of `quote_ladder`: quote = size * rate / (1 + impact / 100)
+def expected_output(fit, reference_rate, size):
+    if size <= 0:
+        return 0.0
+    return size * reference_rate / (1 + expected_impact(fit, size) / 100)
+
+# recommend how to chunk a swap so that every chunk stays within max_slippage
+# params:
+#   - max_slippage -> allowed slippage per swap expressed in percentage points
+#                 2 = 2%
+def recommend_chunks(from_token, to_token, from_amount, max_slippage, steps=8, protocols=""):
+    ladder = quote_ladder(from_token, to_token, from_amount, steps=steps, protocols=protocols)
+    fit = fit_price_impact(ladder)
+    a, b = fit
+
+    if a <= 0 or expected_impact(fit, from_amount) <= max_slippage:
+        max_chunk = from_amount
+    else:
+        # Solve a * size ^ b = max_slippage in log space, b can be tiny for a flat curve
+        log_max_chunk = (math.log(max_slippage) - math.log(a)) / b if max_slippage > 0 else -math.inf
+        if log_max_chunk < math.log(from_amount / MAX_SWAP_CHUNKS):
+            raise Exception("No chunk size keeps the expected slippage under {}%: it would take over {} swaps (impact(size) = {:.6e} * size ^ {:.4f})".format(
+                max_slippage, MAX_SWAP_CHUNKS, a, b
+            ))
+        max_chunk = math.exp(min(log_max_chunk, math.log(from_amount)))
+
+    chunk_count = max(1, math.ceil(from_amount / max_chunk))
+    chunk_size = int(from_amount // chunk_count)
+    chunks = [chunk_size] * chunk_count
+    # Last chunk picks up the rounding dust
+    chunks[-1] += int(from_amount) - chunk_size * chunk_count
+
+    print("------ Quote Ladder ------")
+    for _, row in ladder.iterrows():
+        print("{:>24.6f} -> {:>24.6f}  impact: {:>10.6f}%".format(
+            scale_amount(from_token, 'human', row["size"]),
+            scale_amount(to_token, 'human', row["quote"]),
+            row["impact"]
+        ))
+    print("")
+    print("------ Impact Curve ------")
+    print("impact(size) = {:.6e} * size ^ {:.4f}".format(a, b))
+    print("Full amount expected slippage:           {:.6f}%".format(expected_impact(fit, from_amount)))
+    print("")
+    print("------- Chunk Plan -------")
+    print("Swaps:                                   {}".format(chunk_count))
+    print("Swap size:                               {:.6f}".format(scale_amount(from_token, 'human', chunk_size)))
+    print("Expected slippage per swap:              {:.6f}%".format(expected_impact(fit, chunks[-1])))
+    print("Transaction Slippage:                    {:.6f}%".format(max_slippage))
+    print("")
+
+    plan = SimpleNamespace(
+        chunks=chunks,
+        fit=fit,
+        ladder=ladder,
+        reference_rate=ladder.attrs["reference_rate"],
+    )
+    plan.min_outs = chunk_min_outs(plan, max_slippage)
+    for i, (chunk, (min_out, slippage)) in enumerate(zip(chunks, plan.min_outs)):
+        print("Swap {:>2} min out {:>24.6f}  slippage vs reference {:>10.6f}%".format(
+            i + 1, scale_amount(to_token, 'human', min_out), slippage
+        ))
+    print("")
+    return plan
+
+# minimum output and allowed slippage (vs the reference rate) of every chunk.
+# All chunks of a plan go into one Safe batch and run back to back, so chunk k
+# trades against a pool already moved by the k - 1 chunks before it. Its
+# expected output is the cumulative output of the first k chunks minus that of
+# the first k - 1 (on the fitted curve), and max_slippage is applied on top.
+# Quoting every chunk against the untouched pool would make the later ones revert.
+def chunk_min_outs(plan, max_slippage):
+    min_outs = []
+    done = 0
+    for chunk in plan.chunks:
+        out = expected_output(plan.fit, plan.reference_rate, done + chunk) - expected_output(plan.fit, plan.reference_rate, done)
+        done += chunk
+        min_out = int(out * (100 - max_slippage) / 100)
+        min_outs.append((min_out, (1 - min_out / (chunk * plan.reference_rate)) * 100))
+    return min_outs
+
+# create the swap transactions of a chunk plan
+# params: same as `build_swap_tx`
+#   - dry_run -> If set to True, returns the transactions for the Gnosis Safe batch.
+#                Otherwise runs each swap against the active network
+def build_chunked_swap_txs(from_token, to_token, from_amount, max_slippage, allow_partial_fill=False, dry_run=True, steps=8, protocols=""):
+    plan = recommend_chunks(from_token, to_token, from_amount, max_slippage, steps=steps, protocols=protocols)
+
+    c_vault_admin = vault_admin if from_token in OUSD_ASSET_ADDRESSES else vault_oeth_admin
+
+    txs = []
+    for chunk, (min_tokens_with_slippage, chunk_slippage) in zip(plan.chunks, plan.min_outs):
+        # The 1inch route gets the same widened slippage as the vault's min out
+        to, data = get_1inch_swap(from_token, to_token, chunk, chunk_slippage, allow_partial_fill, min_tokens_with_slippage, protocols=protocols)
+
+        if dry_run == True:
+            txs.append(SimpleNamespace(receiver=to, value=0, input=data))
+        else:
+            decoded_input = c_vault_admin.swapCollateral.decode_input(data)
+            txs.append(c_vault_admin.swapCollateral(*decoded_input, {'from':STRATEGIST}))
+
+    print("----")
+    print("Gnosis json:")
+    print(to_gnosis_json(txs))
+    print("----")
+
+    return txs
+
+
+# from_token, to_token, from_token_amount, slippage
+#build_chunked_swap_txs(USDT, USDC, 5_000_000 * 10**6, 0.1)
@@ -0,0 +1,108 @@
+from world_abstract import *
+
+from types import SimpleNamespace
+
+# Finds the boundary amount of an operation, e.g. the largest reallocation that
+# doesn't revert or the largest swap under 0.5% slippage. Every probe runs
+# `scenario(amount)` in its own node snapshot and reverts it afterwards.
+#
+# The predicate gets the scenario's return value and returns either a bool or
+# a margin (>= 0 means acceptable). Margins let the secant method interpolate
+# towards the boundary instead of halving the range.
+#
+#   solution = solve_boundary(
+#       lambda amount: reallocate(FRAX_STRATEGY, AAVE_STRAT, usdt, amount),
+#       no_revert,
+#       low=0, high=10e6, precision=100,
+#   )
+
+def no_revert(result):
+    return True
+
+# Margin predicates: `value(result)` at least / at most `threshold`
+def at_least(value, threshold):
+    return lambda result: value(result) - threshold
+
+def at_most(value, threshold):
+    return lambda result: threshold - value(result)
+
+# Run one probe in a snapshot. Scenarios that raise (reverts) are never acceptable
+def run_probe(scenario, predicate, amount, setup=None):
+    snapshot_id = evm_snapshot()
+    start = time.time()
+    try:
+        if setup is not None:
+            setup()
+        result = scenario(amount)
+        margin = predicate(result)
+    except Exception:
+        result, margin = None, False
+    finally:
+        evm_revert(snapshot_id)
+    ok = margin if isinstance(margin, bool) else margin >= 0
+    return SimpleNamespace(amount=amount, ok=ok, margin=margin, result=result, elapsed=time.time() - start)
+
+# Largest amount in [low, high] that satisfies the predicate, assuming
+# everything below it does too. `method` is "bisect" or "secant" (regula falsi
+# with the Illinois correction, falls back to bisection for bool predicates).
+# `setup` runs before every probe, e.g. to put a pool into the state under test.
+# Returns the amount (None if `low` fails), the probes and total time.
+def solve_boundary(scenario, predicate, low, high, precision=1, method="bisect", max_probes=64, setup=None, show=True):
+    start = time.time()
+    history = []
+
+    def check(amount):
+        p = run_probe(scenario, predicate, amount, setup)
+        history.append(p)
+        if show:
+            print("  probe {:>3} amount {:>24,.4f} {}".format(len(history), amount, "ok" if p.ok else "fail"))
+        return p
+
+    best = None
+    lo, hi = check(low), check(high)
+    if hi.ok:
+        best = hi
+    elif lo.ok:
+        best = lo
+        # Margins used for interpolation. The Illinois method halves the margin
+        # of an endpoint that is kept twice in a row, so a convex margin (e.g.
+        # slippage) can't pin one side of the bracket
+        lo_margin, hi_margin = lo.margin, hi.margin
+        kept = None
+        while hi.amount - lo.amount > precision and len(history) < max_probes:
+            mid = (lo.amount + hi.amount) / 2
+            if method == "secant" and not isinstance(lo_margin, bool) and not isinstance(hi_margin, bool) and lo_margin != hi_margin:
+                # Interpolate the margin's zero crossing, staying well inside the bracket
+                guess = lo.amount + (hi.amount - lo.amount) * lo_margin / (lo_margin - hi_margin)
+                span = hi.amount - lo.amount
+                mid = min(max(guess, lo.amount + span * 0.05), hi.amount - span * 0.05)
+            if isinstance(low, int) and isinstance(high, int):
+                mid = int(mid)
+            if mid <= lo.amount or mid >= hi.amount:
+                break
+            p = check(mid)
+            if p.ok:
+                lo = best = p
+                lo_margin = p.margin
+                if kept == "hi" and not isinstance(hi_margin, bool):
+                    hi_margin /= 2
+                kept = "hi"
+            else:
+                hi = p
+                hi_margin = p.margin
+                if kept == "lo" and not isinstance(lo_margin, bool):
+                    lo_margin /= 2
+                kept = "lo"
+
+    elapsed = time.time() - start
+    if show:
+        print("Boundary {} after {} probes in {:.2f}s".format(
+            "not found" if best is None else "{:,.4f}".format(best.amount), len(history), elapsed
+        ))
+    return SimpleNamespace(
+        amount=best.amount if best else None,
+        result=best.result if best else None,
+        probes=len(history),
+        elapsed=elapsed,
+        history=history,
+    )
@@ -0,0 +1,95 @@
+from world_abstract import *
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import os
+import pandas as pd
+
+# Samples view calls across a block range on the connected (archive) node.
+# Every sampled block is a single Multicall3 round trip and results are kept in
+# a Parquet file per chain (needs pyarrow), keyed by (chain, block, call), so
+# re-running or extending a query only fetches blocks that aren't cached yet.
+#
+#   from world import *
+#   from timeseries import *
+#   blocks = sample_blocks(days=90, points=90)
+#   df = extract({
+#       "oeth_total_value": (vault_oeth_core.totalValue, []),
+#       "native_staking": (native_staking_strat.checkBalance, [WETH]),
+#   }, blocks)
+
+TIMESERIES_CACHE_DIR = os.getenv('TIMESERIES_CACHE_DIR', 'timeseries_cache')
+# Archive nodes throttle hard when hit with too many concurrent eth_calls
+TIMESERIES_MAX_WORKERS = 8
+SECONDS_PER_DAY = 24 * 60 * 60
+
+def call_key(fn, args):
+    return "{}:{}({})".format(fn._address, fn.abi['name'], ",".join([str(a) for a in args]))
+
+def cache_path(chain_id):
+    return os.path.join(TIMESERIES_CACHE_DIR, "{}.parquet".format(chain_id))
+
+def load_cache(chain_id):
+    path = cache_path(chain_id)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["chain", "block", "call", "timestamp", "value"])
+    return pd.read_parquet(path)
+
+def save_cache(chain_id, df):
+    os.makedirs(TIMESERIES_CACHE_DIR, exist_ok=True)
+    df.to_parquet(cache_path(chain_id), index=False)
+
+# `points` evenly spaced blocks over the last `days`, using the average block
+# time of that period
+def sample_blocks(days, points, end_block=None):
+    if end_block is None:
+        end_block = brownie.chain.height
+    end = brownie.web3.eth.get_block(end_block)
+    probe = brownie.web3.eth.get_block(max(end_block - 100_000, 1))
+    seconds_per_block = (end['timestamp'] - probe['timestamp']) / (end_block - probe['number'])
+    start_block = max(int(end_block - days * SECONDS_PER_DAY / seconds_per_block), 1)
+    return sorted(set([int(b) for b in np.linspace(start_block, end_block, points)]))
+
+# Values are kept as strings so uint256 results survive the round trip through Parquet
+def fetch_block(block, calls, multicall3):
+    fns = [(multicall3.getCurrentBlockTimestamp, [])] + calls
+    results = multicall_raw(fns, block_identifier=block)
+    timestamp = multicall3.getCurrentBlockTimestamp.decode_output(results[0][1])
+    rows = []
+    for (fn, args), (success, data) in zip(calls, results[1:]):
+        value = str(fn.decode_output(data)) if success else None
+        rows.append([brownie.chain.id, block, call_key(fn, args), timestamp, value])
+    return rows
+
+# Sample `calls` ({label: (contract method, args)}) at every block in `blocks`.
+# Returns a DataFrame indexed by block with a timestamp column and one column
+# per label, divided by `scale` (1e18 by default). Calls must return a single
+# number. Reverted calls are NaN.
+def extract(calls, blocks, scale=10**18, max_workers=TIMESERIES_MAX_WORKERS):
+    chain_id = brownie.chain.id
+    keys = {label: call_key(fn, args) for label, (fn, args) in calls.items()}
+    cache = load_cache(chain_id)
+
+    cached = cache[cache["call"].isin(keys.values())].groupby("block")["call"].nunique()
+    missing = [b for b in blocks if cached.get(b, 0) < len(set(keys.values()))]
+    if missing:
+        print("Fetching {} of {} blocks".format(len(missing), len(blocks)))
+        multicall3 = load_contract('multicall3', MULTICALL3)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            fetched = list(executor.map(
+                lambda block: fetch_block(block, list(calls.values()), multicall3),
+                missing
+            ))
+        new_rows = pd.DataFrame([row for rows in fetched for row in rows], columns=cache.columns)
+        cache = pd.concat([cache, new_rows]).drop_duplicates(["chain", "block", "call"], keep="last")
+        save_cache(chain_id, cache)
+
+    rows = cache[cache["block"].isin(blocks) & cache["call"].isin(keys.values())]
+    df = rows.pivot(index="block", columns="call", values="value")
+    out = pd.DataFrame(index=pd.Index(sorted(blocks), name="block"))
+    timestamps = rows.groupby("block")["timestamp"].first().astype(int)
+    out["timestamp"] = pd.to_datetime(timestamps.reindex(out.index), unit="s")
+    for label, key in keys.items():
+        values = df[key].reindex(out.index) if key in df else pd.Series(index=out.index, dtype=object)
+        out[label] = [int(v) / scale if isinstance(v, str) else np.nan for v in values]
+    return out
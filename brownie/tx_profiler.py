@@ -0,0 +1,266 @@
+from world import *
+from events import ABI_DIR, load_abi
+from abi_types import abi_input_type
+
+from collections import defaultdict
+from eth_utils import keccak
+import glob
+import os
+
+# Gas and state profile of transactions sent on a local fork, e.g. a batch
+# recorded in TemporaryForkForReallocations before it gets reverted:
+#
+#   with TemporaryForkForReallocations() as txs:
+#       txs.append(vault_oeth_admin.withdrawFromStrategy(OETH_CONVEX_OETH_ETH_STRAT, [WETH], [1_000 * 10**18], std))
+#       show_profile(profile_txs(txs))
+#
+# Every tx is traced with debug_traceTransaction, once for its struct logs and
+# once with the prestateTracer. Gas is attributed to
+# the contract whose storage a frame runs on (so proxies show under their
+# addresses.py name) and the function it was called with. Storage writes are
+# compared with the values before the tx and ETH / token balance changes are
+# summed per address. Values before the tx come from the prestateTracer, so
+# txs sharing a block (interval mining, batched replays) are told apart. Nodes
+# without it (hardhat) can only profile a tx that is alone in its block.
+
+CALL_OPS = ('CALL', 'CALLCODE', 'DELEGATECALL', 'STATICCALL')
+# Calls that keep the storage of the calling contract
+CONTEXT_PRESERVING_OPS = ('DELEGATECALL', 'CALLCODE')
+
+def build_function_table():
+    table = {}
+    for path in sorted(glob.glob(os.path.join(ABI_DIR, '*.json'))):
+        for item in load_abi(path):
+            if item.get('type') != 'function':
+                continue
+            signature = "{}({})".format(item['name'], ",".join([abi_input_type(i) for i in item['inputs']]))
+            table.setdefault('0x' + keccak(text=signature)[:4].hex(), item['name'])
+    return table
+
+FUNCTION_TABLE = build_function_table()
+
+def function_name(selector):
+    if selector is None:
+        return '(no calldata)'
+    return FUNCTION_TABLE.get(selector, selector)
+
+def word(value):
+    return int(value, 16)
+
+def word_address(value):
+    return brownie.web3.toChecksumAddress('0x' + '{:064x}'.format(word(value))[-40:])
+
+# Selector a CALL* step sends, read from the calldata in memory
+def call_selector(step):
+    stack = step['stack']
+    args_offset = word(stack[-4] if step['op'] in ('CALL', 'CALLCODE') else stack[-3])
+    args_length = word(stack[-4 if step['op'] in ('DELEGATECALL', 'STATICCALL') else -5])
+    memory = "".join([m[2:] if m.startswith('0x') else m for m in step.get('memory') or []])
+    if args_length < 4 or len(memory) < (args_offset + 4) * 2:
+        return None
+    return '0x' + memory[args_offset * 2:(args_offset + 4) * 2]
+
+def struct_logs(tx_hash):
+    result = brownie.web3.provider.make_request(
+        'debug_traceTransaction',
+        [tx_hash, {'enableMemory': True, 'disableStorage': True, 'disableReturnData': True}]
+    )
+    if 'error' in result:
+        raise Exception("debug_traceTransaction failed: {}".format(result['error']))
+    return result['result']['structLogs']
+
+# Gas, SLOAD and SSTORE counts per (contract, selector) and the last value
+# written to every storage slot, from the struct logs of one tx.
+#
+# A step's cost is the drop in remaining gas to the next step in the same
+# frame. The cost of a CALL itself is what the caller lost over the call minus
+# what the callee spent, so call overhead (cold account access, value
+# transfer, memory expansion) stays with the caller.
+def gas_by_function(logs, receiver, input):
+    usage = defaultdict(lambda: {'gas': 0, 'calls': 0, 'sload': 0, 'sstore': 0})
+    writes = {}
+    root = (receiver, input[:10] if len(input) >= 10 else None)
+    usage[root]['calls'] += 1
+    frames = [root]
+    pending = [] # index of the step that made each open call
+    spent = [0] # gas spent inside each open frame, children included
+
+    def charge(frame, gas):
+        usage[frame]['gas'] += gas
+        spent[-1] += gas
+
+    for i, step in enumerate(logs):
+        next_step = logs[i + 1] if i + 1 < len(logs) else None
+        frame = frames[-1]
+        op = step['op']
+
+        if op == 'SLOAD':
+            usage[frame]['sload'] += 1
+        elif op == 'SSTORE':
+            usage[frame]['sstore'] += 1
+            writes[(frame[0], word(step['stack'][-1]))] = word(step['stack'][-2])
+
+        if next_step is not None and next_step['depth'] > step['depth']:
+            if op in CALL_OPS:
+                context = frame[0] if op in CONTEXT_PRESERVING_OPS else word_address(step['stack'][-2])
+                callee = (context, call_selector(step))
+            else:
+                callee = ('(created contract)', None)
+            usage[callee]['calls'] += 1
+            frames.append(callee)
+            pending.append(i)
+            spent.append(0)
+            continue
+
+        if next_step is not None and next_step['depth'] == step['depth']:
+            charge(frame, step['gas'] - next_step['gas'])
+            continue
+
+        # Last step of a frame
+        charge(frame, step['gasCost'])
+        if next_step is not None and pending:
+            call_index = pending.pop()
+            frames.pop()
+            child_gas = spent.pop()
+            charge(frames[-1], logs[call_index]['gas'] - next_step['gas'] - child_gas)
+            spent[-1] += child_gas
+
+    return usage, writes
+
+# Storage and balances the tx changed, before and after it, from the
+# prestateTracer in diff mode (geth, anvil). None if the node doesn't have it
+def prestate_diff(tx_hash):
+    result = brownie.web3.provider.make_request(
+        'debug_traceTransaction',
+        [tx_hash, {'tracer': 'prestateTracer', 'tracerConfig': {'diffMode': True}}]
+    )
+    if 'error' in result:
+        return None
+    return result['result']
+
+# Without a prestate diff the state before the tx is read at the previous
+# block, which is only the state before the tx if nothing else ran in its block
+def assert_only_tx_in_block(tx):
+    count = len(brownie.web3.eth.get_block(tx.block_number)['transactions'])
+    if count != 1:
+        raise Exception("Tx {} shares block {} with {} other txs and the node has no prestateTracer, can't tell its state changes apart".format(
+            tx.txid, tx.block_number, count - 1
+        ))
+
+def diff_account(diff, side, address):
+    return next((v for k, v in diff[side].items() if k.lower() == address.lower()), {})
+
+# Storage slots whose value changed, per contract, and how many writes left a
+# slot as it was. Values after the tx are the last ones it wrote
+def storage_changes(writes, tx, diff):
+    changes = defaultdict(list)
+    no_op_writes = defaultdict(int)
+    for (address, slot), post in writes.items():
+        if not address.startswith('0x'):
+            continue
+        if diff is not None:
+            # Slots the tx changed are on one side of the diff or both (zero values may be left out)
+            pre_storage = {int(k, 16): v for k, v in diff_account(diff, 'pre', address).get('storage', {}).items()}
+            post_storage = {int(k, 16): v for k, v in diff_account(diff, 'post', address).get('storage', {}).items()}
+            pre = int(pre_storage.get(slot, '0x0'), 16) if slot in pre_storage or slot in post_storage else post
+        else:
+            pre = int.from_bytes(brownie.web3.eth.get_storage_at(address, slot, tx.block_number - 1), 'big')
+        if pre == post:
+            no_op_writes[address] += 1
+        else:
+            changes[address].append((slot, pre, post))
+    return changes, no_op_writes
+
+# Net ETH balance change of the addresses the tx touched and net ERC20 flows
+# per (address, token) from its Transfer events
+def balance_changes(tx, addresses, diff):
+    eth = {}
+    for address in addresses:
+        if diff is not None:
+            post = diff_account(diff, 'post', address).get('balance')
+            if post is None:
+                continue
+            diff_amount = int(post, 16) - int(diff_account(diff, 'pre', address).get('balance', '0x0'), 16)
+        else:
+            diff_amount = brownie.web3.eth.get_balance(address, tx.block_number) - brownie.web3.eth.get_balance(address, tx.block_number - 1)
+        if diff_amount != 0:
+            eth[address] = diff_amount
+    tokens = defaultdict(int)
+    for transfer in tx_transfers(tx):
+        tokens[(transfer['from'], transfer['address'])] -= transfer['raw_amount']
+        tokens[(transfer['to'], transfer['address'])] += transfer['raw_amount']
+    return eth, {key: amount for key, amount in tokens.items() if amount != 0}
+
+def profile_tx(tx):
+    logs = struct_logs(tx.txid)
+    usage, writes = gas_by_function(logs, tx.receiver, str(tx.input))
+    diff = prestate_diff(tx.txid)
+    if diff is None:
+        assert_only_tx_in_block(tx)
+    storage, no_op_writes = storage_changes(writes, tx, diff)
+    touched = set([tx.sender] + [address for address, _ in usage if address.startswith('0x')])
+    eth, tokens = balance_changes(tx, touched, diff)
+    return SimpleNamespace(
+        tx=tx,
+        gas_used=tx.gas_used,
+        # Intrinsic gas (21k + calldata) net of refunds
+        overhead=tx.gas_used - sum([u['gas'] for u in usage.values()]),
+        functions=sorted([
+            SimpleNamespace(address=address, label=address_label(address), function=function_name(selector), **u)
+            for (address, selector), u in usage.items()
+        ], key=lambda f: -f.gas),
+        storage=storage,
+        no_op_writes=no_op_writes,
+        eth=eth,
+        tokens=tokens,
+    )
+
+# Profile every sent transaction of a batch. Planned (never sent) txs are skipped
+def profile_txs(txs):
+    return [profile_tx(tx) for tx in txs if hasattr(tx, 'txid')]
+
+def show_function_rows(functions, total, top):
+    table = render_table(["contract", "function", "gas", "%", "calls", "sload", "sstore"], [
+        [f.label, f.function, "{:,}".format(f.gas), "{:.1f}%".format(100 * f.gas / total if total else 0), f.calls, f.sload, f.sstore]
+        for f in functions[:top]
+    ], align=['<', '<', '>', '>', '>', '>', '>'])
+    print("\n".join(["  " + line for line in table.split("\n")]))
+    if len(functions) > top:
+        print("  ... {} more".format(len(functions) - top))
+
+def show_profile(profiles, top=10):
+    totals = {}
+    for i, p in enumerate(profiles):
+        print("----")
+        print("Tx {}: {} {:,} gas ({:,} intrinsic and refunds)".format(
+            i + 1, address_label(p.tx.receiver) + "." + (p.tx.fn_name or '?'), p.gas_used, p.overhead
+        ))
+        show_function_rows(p.functions, p.gas_used, top)
+
+        for address, changes in p.storage.items():
+            print("  storage {:<34} {:>3} slots changed{}".format(
+                address_label(address)[:34], len(changes),
+                ", {} no-op writes".format(p.no_op_writes[address]) if p.no_op_writes.get(address) else ""
+            ))
+        for address, count in p.no_op_writes.items():
+            if address not in p.storage:
+                print("  storage {:<34}   0 slots changed, {} no-op writes".format(address_label(address)[:34], count))
+        for address, diff in p.eth.items():
+            print("  balance {:<34} {} ETH".format(address_label(address)[:34], c18(diff, False)))
+        for (address, token), diff in p.tokens.items():
+            info = token_info(token)
+            amount = commas(diff, info['decimals'], False) if info['decimals'] is not None else str(diff)
+            print("  balance {:<34} {} {}".format(address_label(address)[:34], amount, info['name']))
+
+        for f in p.functions:
+            key = (f.address, f.function)
+            if key not in totals:
+                totals[key] = SimpleNamespace(address=f.address, label=f.label, function=f.function, gas=0, calls=0, sload=0, sstore=0)
+            for field in ('gas', 'calls', 'sload', 'sstore'):
+                setattr(totals[key], field, getattr(totals[key], field) + getattr(f, field))
+
+    if len(profiles) > 1:
+        total_gas = sum([p.gas_used for p in profiles])
+        print("----")
+        print("Batch: {} txs, {:,} gas".format(len(profiles), total_gas))
+        show_function_rows(sorted(totals.values(), key=lambda f: -f.gas), total_gas, top)
@@ -1,4 +1,8 @@
 from world_abstract import *
+from events import decode_log
+from abi_types import parse_signature, decode_arguments, format_value
+from functools import lru_cache
+from types import SimpleNamespace
 
 std = {'from': MULTICHAIN_STRATEGIST}
 
@@ -80,7 +84,7 @@ timelock = brownie.accounts.at(TIMELOCK, force=True)
 gova = brownie.accounts.at(GOVERNOR, force=True)
 governor = load_contract('governor', GOVERNOR)
 governor_five = load_contract('governor_five', GOVERNOR_FIVE)
-governor_six = load_contract('governor_five', '0x1D3Fbd4d129Ddd2372EA85c5Fa00b2682081c9EC')
+governor_six = load_contract('governor_five', GOVERNOR_SIX)
 timelock_contract = load_contract('timelock', TIMELOCK)
 rewards_source = load_contract('rewards_source', REWARDS_SOURCE)
 
@@ -144,28 +148,81 @@ ENDC = '\033[0m'
 def get_erc20_name(address):
     return load_contract('ERC20', address).name()
 
+# address -> label, the names in CONTRACT_ADDRESSES win over the addresses.py constant names
+ADDRESS_LABELS = dict(inv_contracts_map)
+ADDRESS_LABELS.update({address: info['name'] for address, info in CONTRACT_ADDRESSES.items()})
+
+# token address -> {'name', 'decimals'}. Starts from COINS, other tokens are looked up once
+TOKEN_INFO = dict(COINS)
+
+def token_info(address):
+    address = address.lower()
+    if address not in TOKEN_INFO:
+        try:
+            token = load_contract('ERC20', address)
+            TOKEN_INFO[address] = {'name': token.symbol(), 'decimals': token.decimals()}
+        except Exception:
+            TOKEN_INFO[address] = {'name': address[0:10], 'decimals': None}
+    return TOKEN_INFO[address]
+
+def address_label(address):
+    return ADDRESS_LABELS.get(address.lower(), address)
+
+# decode every log of a transaction known to the ABIs in abi/, in one pass
+# Returns a list of dicts with the log index, emitter, event name and arguments.
+def decode_tx_events(tx):
+    records = []
+    for log in tx.logs:
+        decoded = decode_log(log.topics, log.data)
+        if decoded is None:
+            continue
+        event, args = decoded
+        records.append({
+            'log_index': log.logIndex,
+            'address': log.address,
+            'label': address_label(log.address),
+            'event': event.name,
+            'signature': event.signature,
+            'indexed': len(event.indexed_names),
+            'args': args,
+        })
+    return records
+
+# ERC20 transfers of a transaction as dicts: token, from, to, raw amount and
+# amount scaled by the token decimals (None when the token has no decimals)
+def tx_transfers(tx):
+    transfers = []
+    for record in decode_tx_events(tx):
+        # ERC721 transfers index the token id as well
+        if record['signature'] != 'Transfer(address,address,uint256)' or record['indexed'] != 2:
+            continue
+        args = list(record['args'].values())
+        info = token_info(record['address'])
+        raw = args[2]
+        transfers.append({
+            'token': info['name'],
+            'address': record['address'],
+            'from': args[0],
+            'to': args[1],
+            'from_label': address_label(args[0]),
+            'to_label': address_label(args[1]),
+            'raw_amount': raw,
+            'amount': raw / 10**info['decimals'] if info['decimals'] is not None else None,
+        })
+    return transfers
+
 # show transfers of a transaction
 def show_transfers(tx):
-    TRANSFER = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
-    for log in tx.logs:
-        if log.topics and log.topics[0].hex() == TRANSFER:
-            coin = log.address[0:10]
-            amount = str(int(log.data, 16))
-            if log.address.lower() in COINS:
-                coin = COINS[log.address.lower()]['name']
-                amount = commas(int(log.data, 16), COINS[log.address.lower()]['decimals'])
-            from_label = '0x' + log.topics[1].hex().replace("0x000000000000000000000000",'')
-            to_label = '0x' + log.topics[2].hex().replace("0x000000000000000000000000",'')
-            if from_label.lower() in CONTRACT_ADDRESSES:
-                from_label = CONTRACT_ADDRESSES[from_label.lower()]['name']
-            if to_label.lower() in CONTRACT_ADDRESSES:
-                to_label = CONTRACT_ADDRESSES[to_label.lower()]['name']
-            print("\t".join([
-                leading_whitespace(coin, 10),
-                leading_whitespace(from_label, 42),
-                leading_whitespace(to_label, 42),
-                amount
-                ]))
+    transfers = tx_transfers(tx)
+    for transfer in transfers:
+        decimals = token_info(transfer['address'])['decimals']
+        print("\t".join([
+            leading_whitespace(transfer['token'], 10),
+            leading_whitespace(transfer['from_label'], 42),
+            leading_whitespace(transfer['to_label'], 42),
+            commas(transfer['raw_amount'], decimals) if decimals is not None else str(transfer['raw_amount'])
+            ]))
+    return transfers
 
 # show complete vault holdings: stable coins & strategies
 def show_vault_holdings():
@@ -307,34 +364,16 @@ def show_ousd_metastrat_underlying_balance():
     print("---------------------")
 
 # show changes in Vault's & OUSD's supply once the code block exits 
-class SupplyChanges:
+class SupplyChanges(Observe):
     def __init__(self, txOptions):
-        self.txOptions=txOptions
-
-    def __enter__(self):
-        self.vaultTotalValue = vault_core.totalValue(self.txOptions)
-        self.ousdTotalSupply = ousd.totalSupply(self.txOptions)
-        # TODO: Uncomment once this becomes available
-        #self.netOusdMinted = vault_core.netOusdMintedForStrategy()
-        return self
-
-    def __exit__(self, *args, **kwargs):
-        vaultTotalValue = vault_core.totalValue(self.txOptions)
-        ousdTotalSupply = ousd.totalSupply(self.txOptions)
-        # TODO: Uncomment once this becomes available
-        #netOusdMinted = vault_core.netOusdMintedForStrategy()
-        rateBefore = self.vaultTotalValue / self.ousdTotalSupply
-        rateAfter = vaultTotalValue / ousdTotalSupply
-
-        print("----------- Supply Changes -------------")
-        print("                      " + leading_whitespace("Before") + " " + leading_whitespace("After") + " " + leading_whitespace("Difference"))
-        print("Vault value :         " + c18(self.vaultTotalValue) + " " + c18(vaultTotalValue) + " " + c18(vaultTotalValue - self.vaultTotalValue))
-        print("OUSD total supply :   " + c18(self.ousdTotalSupply) + " " + c18(ousdTotalSupply) + " " + c18(ousdTotalSupply - self.ousdTotalSupply))
-        print("Vault/OUSD diff :     " + c18(self.vaultTotalValue-self.ousdTotalSupply) + " " + c18(vaultTotalValue-ousdTotalSupply) + " " + c18(self.vaultTotalValue-self.ousdTotalSupply - (vaultTotalValue-ousdTotalSupply)))
-        print("Rate change :         " + leading_whitespace('{:0.4f}%'.format(rateBefore)) + " " + leading_whitespace('{:0.4f}%'.format(rateAfter)) + " " + leading_whitespace('{:0.4f}%'.format(rateAfter - rateBefore)))
-        # TODO: Uncomment once this becomes available
-        # print("OUSD strategy minted: " + c18(self.netOusdMinted) + " " + c18(netOusdMinted) + " " + c18(netOusdMinted - self.netOusdMinted))
-        print("----------------------------------------")
+        super().__init__("Supply", [
+            observe_row("Vault value", (vault_core.totalValue, [])),
+            observe_row("OUSD total supply", (ousd.totalSupply, [])),
+            observe_row("Vault/OUSD diff", lambda v: v["Vault value"] - v["OUSD total supply"]),
+            observe_row("Rate", lambda v: v["Vault value"] / v["OUSD total supply"], lambda r: leading_whitespace('{:0.4f}%'.format(r))),
+            # TODO: Uncomment once this becomes available
+            # observe_row("OUSD strategy minted", (vault_core.netOusdMintedForStrategy, [])),
+        ])
         
 
 def show_proposal(id):
@@ -370,41 +409,37 @@ def nice_contract_address(address):
     return address
 
 
-def show_governance_action(i, to, sig, data):
+def show_governance_action(i, to, sig, data, value=0):
     print("{}) {}".format(i+1, nice_contract_address(to)))
     print("     "+ORANGE+sig+ENDC)
-    # print("Post Sig Data: ", data)
-    if re.match(".*\(\)", sig):
+    _, types = parse_signature(sig)
+    if not types:
         return
 
-    split_sig = re.split("^[^\(]*", sig)[1]
-    split_sig = re.split(",|\)$|^\(", split_sig)[1:-1]
-
-    stypes = []
-    nested_struct = []
-    nested = False
-    for s in split_sig:
-        if s.startswith("("):
-            stypes.append([s[1:]])
-            nested = True
-        elif s.endswith(")"):
-            stypes[len(stypes) - 1].append(s[:-1])
-            stypes[len(stypes) - 1] = "({})".format(",".join(stypes[len(stypes) - 1]))
-            nested = False
-        elif nested:
-            stypes[len(stypes) - 1].append(s)
-        else:
-            stypes.append(s)
-
-    decodes = abi.decode_abi(stypes, data)
-    for j in range(0, len(stypes)):
-        v = decodes[j]
-        if stypes[j] == "address":
-            print(" >> ", nice_contract_address(v))
-        elif stypes[j] == "bytes":
-            print(" >> ", v.hex())
-        else:
-            print(" >> ", ORANGE+str(v)+ENDC)
+    decodes = decode_arguments(sig, data)
+    for abi_type, v in zip(types, decodes):
+        lines = format_value(abi_type, v, format_address=nice_contract_address)
+        if abi_type.kind == 'base' and abi_type.canonical != 'address' and not isinstance(v, bytes):
+            lines = [ORANGE+lines[0]+ENDC]
+        print(" >> ", lines[0])
+        for line in lines[1:]:
+            print("    ", line)
+    if value != 0:
+        print("    TRANSFERS ETH!!! %d !!!" % value)
+
+# show every action of a proposal, read with a single getActions call.
+# Works for the legacy governor (targets, signatures, calldatas) and the
+# OpenZeppelin based ones (targets, values, signatures, calldatas)
+def show_proposal_actions(governor_contract, proposal_id):
+    actions = governor_contract.getActions(proposal_id)
+    if len(actions) == 3:
+        targets, signatures, calldatas = actions
+        values = [0] * len(targets)
+    else:
+        targets, values, signatures, calldatas = actions
+    for i in range(0, len(targets)):
+        print("")
+        show_governance_action(i=i, to=targets[i], sig=signatures[i], data=calldatas[i], value=values[i])
 
 def show_txs_data(txs):
     print("Schedule the following transactions on Gnosis Safe")
@@ -413,36 +448,26 @@ def show_txs_data(txs):
         print("To: ", item.receiver)
         print("Data (Hex encoded): ", item.input, "\n")
 
-class TemporaryForkForOUSD:
-    def __enter__(self, profit_variance, vault_value_variance):
-        self.txs = []
+ousd_value_check = VaultValueCheck(vault_core, ousd, vault_value_checker)
+oeth_value_check = VaultValueCheck(vault_oeth_core, oeth, oeth_vault_value_checker)
+
+class TemporaryForkWithValueCheck:
+    def __init__(self, value_check, profit_variance, vault_value_variance):
+        self.value_check = value_check
         self.profit_variance = profit_variance
         self.vault_value_variance = vault_value_variance
+
+    def __enter__(self):
+        self.txs = []
         brownie.chain.snapshot()
 
         # Before
-        self.txs.append(vault_core.rebase(std))
-        self.txs.append(vault_value_checker.takeSnapshot(std))
+        self.txs.extend(self.value_check.take_snapshot())
 
         return self.txs
 
     def __exit__(self, *args, **kwargs):
-        vault_change = vault_core.totalValue() - vault_value_checker.snapshots(STRATEGIST)[0]
-        supply_change = ousd.totalSupply() - vault_value_checker.snapshots(STRATEGIST)[1]
-        profit = vault_change - supply_change
-
-        self.txs.append(
-            vault_value_checker.checkDelta(
-                profit, 
-                self.profit_variance, 
-                vault_change, 
-                self.vault_value_variance, 
-                std
-            )
-        )
-        print("-----")
-        print("Profit", "{:.6f}".format(profit / 10**18), profit)
-        print("Vault Change", "{:.6f}".format(vault_change / 10**18), vault_change)
+        self.txs.append(self.value_check.check_delta(self.profit_variance, self.vault_value_variance))
 
         brownie.chain.revert()
         print("----")
@@ -450,63 +475,148 @@ class TemporaryForkForOUSD:
         print(to_gnosis_json(self.txs))
         print("----")
 
-class TemporaryForkForOETH:
-    def __enter__(self, profit_variance, vault_value_variance):
-        self.txs = []
-        self.profit_variance = profit_variance
-        self.vault_value_variance = vault_value_variance
-        brownie.chain.snapshot()
+class TemporaryForkForOUSD(TemporaryForkWithValueCheck):
+    def __init__(self, profit_variance, vault_value_variance):
+        super().__init__(ousd_value_check, profit_variance, vault_value_variance)
 
-        # Before
-        self.txs.append(vault_oeth_core.rebase(std))
-        self.txs.append(oeth_vault_value_checker.takeSnapshot(std))
+class TemporaryForkForOETH(TemporaryForkWithValueCheck):
+    def __init__(self, profit_variance, vault_value_variance):
+        super().__init__(oeth_value_check, profit_variance, vault_value_variance)
 
-        return self.txs
 
-    def __exit__(self, *args, **kwargs):
-        vault_change = vault_oeth_core.totalValue() - oeth_vault_value_checker.snapshots(STRATEGIST)[0]
-        supply_change = oeth.totalSupply() - oeth_vault_value_checker.snapshots(STRATEGIST)[1]
-        profit = vault_change - supply_change
-
-        self.txs.append(
-            oeth_vault_value_checker.checkDelta(
-                profit, 
-                self.profit_variance, 
-                vault_change, 
-                self.vault_value_variance, 
-                std
-            )
-        )
-        print("-----")
-        print("Profit", "{:.6f}".format(profit / 10**18), profit)
-        print("Vault Change", "{:.6f}".format(vault_change / 10**18), vault_change)
+def show_governor_four_proposal_actions(proposal_id):
+    show_proposal_actions(governor, proposal_id)
 
-        brownie.chain.revert()
-        print("----")
-        print("Gnosis json:")
-        print(to_gnosis_json(self.txs))
-        print("----")
 
+def show_governor_five_proposal_actions(proposal_id):
+    show_proposal_actions(governor_five, proposal_id)
 
-def show_governor_four_proposal_actions(proposal_id):
-    actions = governor.getActions(proposal_id)
-    for i in range(0, len(actions[0])):
-        print("")
-        show_governance_action(
-            i=i, to=actions[0][i], sig=actions[1][i], data=actions[2][i]
-        )
 
+def show_governor_six_proposal_actions(proposal_id):
+    show_proposal_actions(governor_six, proposal_id)
 
-def show_governor_five_proposal_actions(proposal_id):
-    actions = governor_five.getActions(proposal_id)
-    for i in range(0, len(actions[0])):
-        print("")
-        show_governance_action(
-            i=i, to=actions[0][i], sig=actions[2][i], data=actions[3][i]
-        )
-        if actions[1][i] != 0:
-            print("    TRANSFERS ETH!!! %d !!!", actions[1][i])
 
+# Gas each simulated action may use. Actions are sent without estimates since
+# they run against state the earlier actions haven't written yet, so the block
+# gas limit is raised to fit them all in one block
+SIM_ACTION_GAS = 10_000_000
+# Blocks to mine waiting for the actions before giving up on them
+SIM_MAX_BLOCKS = 3
+
+@lru_cache(maxsize=None)
+def selector_for(sig):
+    return brownie.web3.keccak(text=sig).hex()[:10]
+
+def action_calldata(sig, data):
+    data = data.hex() if isinstance(data, bytes) else str(data)
+    if sig == '':
+        # OpenZeppelin governors allow the selector to be part of the calldata
+        return data
+    return selector_for(sig) + data[2:]
+
+def storage_diff(tx_hash):
+    "Changed storage slots per contract, if the node supports the prestate tracer"
+    try:
+        trace = brownie.web3.provider.make_request('debug_traceTransaction', [tx_hash, {'tracer': 'prestateTracer', 'tracerConfig': {'diffMode': True}}])
+        post = trace['result']['post']
+        return {address: len(state.get('storage', {})) for address, state in post.items() if state.get('storage')}
+    except Exception:
+        return None
+
+def sim_execute_proposal(governor_contract, proposal_id, timelock=TIMELOCK, revert=True, show=False, state_diffs=False):
+    """
+    Simulate every action of a proposal as the timelock in one fork step.
+
+    Automining is paused while all actions are sent from the impersonated
+    timelock, then they are mined together in a block with room for all of
+    them. Bypasses voting and the timelock delay. Returns the gas used, status
+    and (optionally) changed storage slots of every action, and raises if any
+    action reverted. With revert=True the fork is rolled back after.
+    """
+    actions = governor_contract.getActions(proposal_id)
+    if len(actions) == 3:
+        targets, signatures, calldatas = actions
+        values = [0] * len(targets)
+    else:
+        targets, values, signatures, calldatas = actions
+
+    web3 = brownie.web3
+    provider = web3.provider
+    snapshot = evm_snapshot() if revert else None
+    try:
+        unlock(timelock)
+        # Only top up the timelock by what the gas can cost, so actions moving
+        # ETH still run against its real balance. Given back after mining
+        gas_price = 2 * web3.eth.gas_price
+        top_up = SIM_ACTION_GAS * len(targets) * gas_price
+        fund_eth(timelock, hex(web3.eth.get_balance(timelock) + top_up))
+        block_gas_limit = web3.eth.get_block('latest')['gasLimit']
+        provider.make_request('evm_setBlockGasLimit', [hex(max(block_gas_limit, SIM_ACTION_GAS * len(targets)))])
+        provider.make_request('evm_setAutomine', [False])
+        receipts = {}
+        try:
+            tx_hashes = []
+            for i in range(0, len(targets)):
+                if show:
+                    show_governance_action(i=i, to=targets[i], sig=signatures[i], data=calldatas[i], value=values[i])
+                tx_hashes.append(web3.eth.send_transaction({
+                    'from': timelock,
+                    'to': targets[i],
+                    'data': action_calldata(signatures[i], calldatas[i]),
+                    'value': values[i],
+                    'gas': SIM_ACTION_GAS,
+                    'gasPrice': gas_price,
+                }))
+            for _ in range(SIM_MAX_BLOCKS):
+                mine_block()
+                for tx_hash in tx_hashes:
+                    if tx_hash not in receipts:
+                        try:
+                            receipts[tx_hash] = web3.eth.get_transaction_receipt(tx_hash)
+                        except Exception:
+                            pass
+                if len(receipts) == len(tx_hashes):
+                    break
+        finally:
+            provider.make_request('evm_setAutomine', [True])
+            provider.make_request('evm_setBlockGasLimit', [hex(block_gas_limit)])
+            fees = sum([r['gasUsed'] * r['effectiveGasPrice'] for r in receipts.values()])
+            fund_eth(timelock, hex(web3.eth.get_balance(timelock) - top_up + fees))
+        if len(receipts) < len(tx_hashes):
+            raise Exception("{} of {} proposal actions were not mined after {} blocks".format(
+                len(tx_hashes) - len(receipts), len(tx_hashes), SIM_MAX_BLOCKS
+            ))
+
+        results = []
+        for i, tx_hash in enumerate(tx_hashes):
+            receipt = receipts[tx_hash]
+            results.append(SimpleNamespace(
+                index=i,
+                target=targets[i],
+                signature=signatures[i],
+                success=receipt['status'] == 1,
+                gas_used=receipt['gasUsed'],
+                tx_hash=tx_hash.hex(),
+                storage_diff=storage_diff(tx_hash.hex()) if state_diffs else None,
+            ))
+
+        print("{:>3} {:<8} {:>10}  {}".format("#", "status", "gas", "action"))
+        for r in results:
+            print("{:>3} {:<8} {:>10,}  {} {}".format(r.index + 1, "ok" if r.success else "REVERTED", r.gas_used, nice_contract_address(r.target), r.signature))
+            if r.storage_diff:
+                for address, slots in r.storage_diff.items():
+                    print("               {} slots changed on {}".format(slots, nice_contract_address(address)))
+        print("Total gas: {:,}".format(sum([r.gas_used for r in results])))
+
+        reverted = [r for r in results if not r.success]
+        if reverted:
+            raise Exception("Proposal {} actions reverted: {}".format(
+                len(reverted), ", ".join(["#{} {}".format(r.index + 1, r.signature) for r in reverted])
+            ))
+        return results
+    finally:
+        if revert:
+            evm_revert(snapshot)
 
 def sim_execute_governor_five(proposal_id):
     """
@@ -515,17 +625,7 @@ def sim_execute_governor_five(proposal_id):
 
     This skips the governance process time and block delays.
     """
-    actions = governor_five.getActions(proposal_id)
-    timelock = brownie.accounts.at(TIMELOCK, force=True)
-    for i in range(0, len(actions[0])):
-        show_governance_action(
-            i=i, to=actions[0][i], sig=actions[2][i], data=actions[3][i]
-        )
-        # Build actual data
-        sighash = brownie.web3.keccak(text=actions[2][i]).hex()[:10]
-        data = sighash + str(actions[3][i])[2:]
-        # Send it
-        timelock.transfer(to=actions[0][i], data=data, amount=actions[1][i])
+    return sim_execute_proposal(governor_five, proposal_id, revert=False, show=True)
 
 def sim_execute_governor_six(proposal_id):
     """
@@ -534,17 +634,7 @@ def sim_execute_governor_six(proposal_id):
 
     This skips the governance process time and block delays.
     """
-    actions = governor_six.getActions(proposal_id)
-    timelock = brownie.accounts.at(TIMELOCK, force=True)
-    for i in range(0, len(actions[0])):
-        show_governance_action(
-            i=i, to=actions[0][i], sig=actions[2][i], data=actions[3][i]
-        )
-        # Build actual data
-        sighash = brownie.web3.keccak(text=actions[2][i]).hex()[:10]
-        data = sighash + str(actions[3][i])[2:]
-        # Send it
-        timelock.transfer(to=actions[0][i], data=data, amount=actions[1][i])
+    return sim_execute_proposal(governor_six, proposal_id, revert=False, show=True)
 
 @contextmanager
 def silent_tx():
@@ -3,9 +3,14 @@ import json
 import time
 import re
 from eth_abi import abi
+from eth_abi.packed import encode_packed
 from addresses import *
 import addresses # We want to be able to get to addresses as a dict
 from contextlib import redirect_stdout, contextmanager
+from types import SimpleNamespace
+from collections import namedtuple
+import numpy as np
+import pandas as pd
 
 def abi_to_disk(name, contract):
     with open("abi/%s.json" % name, 'w') as f:
@@ -16,6 +21,51 @@ def load_contract(name, address):
         abi = json.load(f)
         return brownie.Contract.from_abi(name, address, abi)
 
+_multicall3 = None
+
+# Run contract calls in as few Multicall3 round trips as possible.
+# `calls` is a list of (contract method, args) tuples, e.g. [(vault_core.totalValue, [])]
+# Returns a (success, return data) tuple for every call, in order.
+def multicall_raw(calls, block_identifier=None, batch_size=100):
+    global _multicall3
+    if _multicall3 is None:
+        _multicall3 = load_contract('multicall3', MULTICALL3)
+
+    results = []
+    for i in range(0, len(calls), batch_size):
+        batch = calls[i:i + batch_size]
+        results.extend(_multicall3.aggregate3.call(
+            [(fn._address, True, fn.encode_input(*args)) for fn, args in batch],
+            block_identifier=block_identifier
+        ))
+    return [(success, data) for success, data in results]
+
+# Same as `multicall_raw` but decodes the results. Calls that revert return None.
+def multicall(calls, block_identifier=None, batch_size=100):
+    results = multicall_raw(calls, block_identifier, batch_size)
+    return [
+        fn.decode_output(data) if success else None
+        for (fn, _), (success, data) in zip(calls, results)
+    ]
+
+# Human readable reason from the return data of a reverted call
+def decode_revert_reason(data):
+    data = bytes(data)
+    if data[:4] == bytes.fromhex('08c379a0'): # Error(string)
+        return abi.decode_abi(['string'], data[4:])[0]
+    if data[:4] == bytes.fromhex('4e487b71'): # Panic(uint256)
+        return "Panic({:#x})".format(abi.decode_abi(['uint256'], data[4:])[0])
+    if len(data) == 0:
+        return "Reverted without reason"
+    return "Custom error 0x{}".format(data.hex())
+
+# Encode a Uniswap V3 style path: (token, fee or tick spacing, token, ...)
+def encode_v3_path(*hops):
+    return encode_packed(
+        ['address' if i % 2 == 0 else 'int24' for i in range(len(hops))],
+        list(hops)
+    )
+
 # unlock an address to issue transactions as that address
 def unlock(address):
     brownie.network.web3.provider.make_request('hardhat_impersonateAccount', [address])
@@ -31,20 +81,93 @@ def fund_eth(address, balance):
 def mine_block():
     brownie.network.web3.provider.make_request('evm_mine', [])
 
+# Raw node snapshots. Unlike brownie.chain.snapshot() they can be nested, so
+# they are safe to use inside a TemporaryFork. A snapshot is gone once reverted to
+def evm_snapshot():
+    return brownie.network.web3.provider.make_request('evm_snapshot', [])['result']
+
+def evm_revert(snapshot_id):
+    brownie.network.web3.provider.make_request('evm_revert', [snapshot_id])
+    # Resync brownie the way chain.revert does: drop reverted txs from
+    # history and the contract caches, and reset the local time offset
+    brownie.chain._undo_buffer.clear()
+    brownie.chain._redo_buffer.clear()
+    brownie.network.state._notify_registry()
+    try:
+        brownie.chain.sleep(0)
+    except NotImplementedError:
+        pass
+
 def leading_whitespace(s, desired = 16):
-    return ' ' * (desired-len(s)) + s
+    return s.rjust(desired)
+
+# Exact string of a fixed point token amount, with integer math only so
+# amounts above 2**53 wei don't lose precision. Truncated towards zero to whole
+# units, or with truncate=False to 4 decimals and then rounded to 2.
+def amount_string(v, decimals = 18, truncate=True):
+    if isinstance(v, float):
+        # Already inexact, float math keeps e.g. 1e24 at 1,000,000 instead of 999,999
+        if truncate:
+            return f'{int(v / 10**decimals):,}'
+        return f'{int(10**4 * v / 10**decimals) / 10**4:,.2f}'
+    v = int(v)
+    negative = v < 0
+    v = abs(v)
+    if truncate:
+        units = v // 10**decimals
+        s = f'{units:,}'
+    else:
+        # Any amount left after truncating to 4 decimals keeps its sign, e.g. -0.00
+        units = v * 10**4 // 10**decimals
+        hundredths, rest = divmod(units, 100)
+        if rest > 50 or (rest == 50 and hundredths % 2 == 1):
+            hundredths += 1
+        s = f'{hundredths // 100:,}.{hundredths % 100:02d}'
+    return '-' + s if negative and units != 0 else s
 
 def commas(v, decimals = 18, truncate=True):
     """Pretty format token amounts as floored, fixed size dollars"""
+    return leading_whitespace(amount_string(v, decimals, truncate), 16)
 
-    if not truncate:
-        v = int(10**4 * v / 10**decimals) / 10**4
-        s = f'{v:,.2f}'
+# `amount_string` for a whole column (pandas Series, numpy array or list) of
+# raw amounts. The division runs on the column as a whole, on Python ints so
+# it stays exact. None (e.g. a reverted read) stays None. Returns a Series for
+# a Series, a list otherwise
+def amount_strings(values, decimals = 18, truncate=True):
+    index = values.index if isinstance(values, pd.Series) else None
+    values = list(values)
+    present = [i for i, v in enumerate(values) if v is not None]
+    strings = [None] * len(values)
+    if any(isinstance(values[i], float) for i in present):
+        for i in present:
+            strings[i] = amount_string(values[i], decimals, truncate)
+        return pd.Series(strings, index=index) if index is not None else strings
+    raw = np.array([int(values[i]) for i in present], dtype=object)
+    negative = raw < 0
+    raw = np.abs(raw)
+    if truncate:
+        units = raw // 10**decimals
+        column = [f'{u:,}' for u in units]
     else:
-        v = int(v / 10**decimals)
-        s = f'{v:,}'
+        units = raw * 10**4 // 10**decimals
+        hundredths, rest = units // 100, units % 100
+        hundredths = hundredths + ((rest > 50) | ((rest == 50) & (hundredths % 2 == 1)))
+        column = [f'{h // 100:,}.{h % 100:02d}' for h in hundredths]
+    for i, string, n, u in zip(present, column, negative, units):
+        strings[i] = '-' + string if n and u != 0 else string
+    return pd.Series(strings, index=index) if index is not None else strings
 
-    return leading_whitespace(s, 16)
+# Column aligned text table. Text columns are left aligned and numbers right
+# aligned, each column as wide as its widest cell
+def render_table(headers, rows, align=None, separator='  '):
+    rows = [[str(cell) for cell in row] for row in rows]
+    widths = [max([len(h)] + [len(row[i]) for row in rows]) for i, h in enumerate(headers)]
+    if align is None:
+        align = ['<' if i == 0 else '>' for i in range(len(headers))]
+    lines = [separator.join(f'{cell:{a}{w}}' for cell, a, w in zip(headers, align, widths))]
+    for row in rows:
+        lines.append(separator.join(f'{cell:{a}{w}}' for cell, a, w in zip(row, align, widths)))
+    return "\n".join(lines)
 
 # format BigNumber represented in 24 decimals
 def c24(v):
@@ -69,6 +192,198 @@ def prices(p, decimals = 18):
 def pcts (p):
     return leading_whitespace('{:0.4f}%'.format(p), 16)
 
+# Conditions the vault value check is re-run under to recommend variances.
+# Each is a (label, callable that changes the fork) pair
+VALUE_CHECK_PERTURBATIONS = [
+    ("next block", lambda: brownie.chain.mine(1, timedelta=12)),
+    ("+1 hour", lambda: brownie.chain.mine(1, timedelta=60 * 60)),
+    ("+1 day", lambda: brownie.chain.mine(1, timedelta=24 * 60 * 60)),
+]
+# Recommended variances are the largest deviation seen times this margin
+VALUE_CHECK_SAFETY_FACTOR = 2
+
+# Rebase + vault value checker snapshot before a batch and checkDelta after it,
+# for any vault / OToken / VaultValueChecker. The reads after the batch are a
+# single multicall.
+class VaultValueCheck:
+    def __init__(self, vault_core, otoken, checker, strategist=STRATEGIST):
+        self.vault_core = vault_core
+        self.otoken = otoken
+        self.checker = checker
+        self.strategist = strategist
+
+    def take_snapshot(self):
+        return [
+            self.vault_core.rebase({'from': self.strategist}),
+            self.checker.takeSnapshot({'from': self.strategist}),
+        ]
+
+    def deltas(self):
+        total_value, total_supply, snapshot = multicall([
+            (self.vault_core.totalValue, []),
+            (self.otoken.totalSupply, []),
+            (self.checker.snapshots, [self.strategist]),
+        ])
+        vault_change = total_value - snapshot[0]
+        supply_change = total_supply - snapshot[1]
+        return SimpleNamespace(vault_change=vault_change, supply_change=supply_change, profit=vault_change - supply_change)
+
+    def check_delta(self, profit_variance, vault_change_variance, show=True):
+        deltas = self.deltas()
+        if show:
+            print("-----")
+            print("Profit", "{:.6f}".format(deltas.profit / 10**18), deltas.profit)
+            print("Vault Change", "{:.6f}".format(deltas.vault_change / 10**18), deltas.vault_change)
+        return self.checker.checkDelta(
+            deltas.profit,
+            profit_variance,
+            deltas.vault_change,
+            vault_change_variance,
+            {'from': self.strategist}
+        )
+
+    def recommend_variances(self, scenario, perturbations=VALUE_CHECK_PERTURBATIONS, min_variance=10**15):
+        """
+        Run `scenario` (a callable sending the batch's transactions) as is and
+        under every perturbation, each in its own snapshot. Recommends variances
+        that cover how far profit and vault change moved between the runs.
+        """
+        samples = []
+        for label, perturb in [("as is", None)] + list(perturbations):
+            snapshot_id = evm_snapshot()
+            try:
+                if perturb is not None:
+                    perturb()
+                self.take_snapshot()
+                scenario()
+                samples.append((label, self.deltas()))
+            finally:
+                evm_revert(snapshot_id)
+
+        base = samples[0][1]
+        profit_variance = max([min_variance] + [abs(d.profit - base.profit) * VALUE_CHECK_SAFETY_FACTOR for _, d in samples])
+        vault_change_variance = max([min_variance] + [abs(d.vault_change - base.vault_change) * VALUE_CHECK_SAFETY_FACTOR for _, d in samples])
+
+        print("{:<12} {} {}".format("", leading_whitespace("Profit"), leading_whitespace("Vault change")))
+        for label, d in samples:
+            print("{:<12} {} {}".format(label, c18(d.profit, False), c18(d.vault_change, False)))
+        print("Recommended profitVariance {:,} vaultChangeVariance {:,}".format(profit_variance, vault_change_variance))
+
+        return SimpleNamespace(
+            profit=base.profit,
+            vault_change=base.vault_change,
+            profit_variance=int(profit_variance),
+            vault_change_variance=int(vault_change_variance),
+            samples=samples,
+        )
+
+# One line of an `Observe` table. `source` is a view call as a (contract
+# method, args) tuple, read through multicall, or a function of the values of
+# the rows above it, e.g. lambda v: v['DAI'] + v['USDC'] * 10**12
+ObserveRow = namedtuple('ObserveRow', ['label', 'source', 'fmt'])
+
+def observe_row(label, source, fmt=c18):
+    return ObserveRow(label, source, fmt)
+
+# token.balanceOf(account) rows for every account x token. `tokens` is a list
+# of (label, token contract, formatter)
+def balance_rows(accounts, tokens):
+    if not isinstance(accounts, (list, tuple)):
+        accounts = [accounts]
+    return [
+        observe_row(label if len(accounts) == 1 else "{} {}".format(label, account[:8]), (token.balanceOf, [account]), fmt)
+        for account in accounts
+        for label, token, fmt in tokens
+    ]
+
+# Shows how view calls change over a code block. Each side is read with a
+# single multicall, whatever the number of rows:
+#
+#   with Observe("OETH supply", [
+#       observe_row("Vault value", (vault_oeth_core.totalValue, [])),
+#       observe_row("OETH supply", (oeth.totalSupply, [])),
+#       observe_row("Vault/OETH diff", lambda v: v["Vault value"] - v["OETH supply"]),
+#   ]):
+#       ...
+#
+# Several observers combined with observe_all share the same two reads. Rows
+# whose call reverted, or that are computed from one that did, are None and
+# shown as "reverted".
+def observe_difference(before, after):
+    return None if before is None or after is None else after - before
+
+class Observe:
+    def __init__(self, title, rows, show=True):
+        self.sections = [(title, rows)]
+        self.show_on_exit = show
+
+    def read(self):
+        calls = [row.source for _, rows in self.sections for row in rows if isinstance(row.source, tuple)]
+        results = iter(multicall(calls))
+        values = []
+        for _, rows in self.sections:
+            section = {}
+            for row in rows:
+                if isinstance(row.source, tuple):
+                    section[row.label] = next(results)
+                    continue
+                try:
+                    section[row.label] = row.source(section)
+                except TypeError:
+                    if None not in section.values():
+                        raise
+                    section[row.label] = None
+            values.append(section)
+        return values
+
+    def __enter__(self):
+        self.before = self.read()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.after = self.read()
+        if self.show_on_exit:
+            self.show()
+
+    # before / after / difference of every row as a DataFrame (object dtype,
+    # values stay exact integers), indexed by (section, label). With decimals
+    # the columns are formatted amount strings instead
+    def frame(self, decimals=None, truncate=True):
+        records = []
+        for (title, rows), before, after in zip(self.sections, self.before, self.after):
+            for row in rows:
+                records.append((title, row.label, before[row.label], after[row.label], observe_difference(before[row.label], after[row.label])))
+        df = pd.DataFrame(records, columns=['section', 'label', 'before', 'after', 'difference'], dtype=object).set_index(['section', 'label'])
+        if decimals is not None:
+            for column in ['before', 'after', 'difference']:
+                df[column] = amount_strings(df[column], decimals, truncate).fillna("reverted")
+        return df
+
+    # Print the tables, optionally only some of the sections / row labels
+    def show(self, sections=None, labels=None):
+        for (title, rows), before, after in zip(self.sections, self.before, self.after):
+            if sections is not None and title not in sections:
+                continue
+            rows = [row for row in rows if labels is None or row.label in labels]
+            if not rows:
+                continue
+            table = render_table(["", "Before", "After", "Difference"], [
+                [row.label + ":"] + [
+                    "reverted" if v is None else row.fmt(v).strip()
+                    for v in (before[row.label], after[row.label], observe_difference(before[row.label], after[row.label]))
+                ]
+                for row in rows
+            ])
+            width = max(40, len(table.split("\n")[0]))
+            print(" {} changes ".format(title).center(width, '-'))
+            print(table)
+            print("-" * width)
+
+def observe_all(*observers):
+    combined = Observe(None, [], observers[0].show_on_exit if observers else True)
+    combined.sections = [section for observer in observers for section in observer.sections]
+    return combined
+
 # crate a temporary fork of a node that cleans up ethereum state when exiting code block
 class TemporaryFork:
     def __enter__(self):
@@ -90,7 +405,7 @@ class TemporaryForkForReallocations:
         print("Gnosis json:")
         print(to_gnosis_json(self.txs))
         print("----")
-        print("Est Gas Max: {:,}".format(1.10 * sum([x.gas_used for x in self.txs])))
+        show_multisend_gas(self.txs, STRATEGIST)
 
 class TemporaryForkForOETHbReallocations:
     def __enter__(self):
@@ -105,7 +420,63 @@ class TemporaryForkForOETHbReallocations:
         print("Gnosis json:")
         print(to_gnosis_json(self.txs, OETHB_STRATEGIST, "8453"))
         print("----")
-        print("Est Gas Max: {:,}".format(1.10 * sum([x.gas_used for x in self.txs])))
+        show_multisend_gas(self.txs, OETHB_STRATEGIST, "8453")
+
+# A transaction that was only encoded, never sent. Has the same receiver,
+# value and input fields as a brownie TransactionReceipt
+class PlannedTx:
+    def __init__(self, receiver, value, input, fn_name, sender=None):
+        self.receiver = receiver
+        self.value = value
+        self.input = input
+        self.fn_name = fn_name
+        self.sender = sender
+        self.gas_used = 0
+
+    def __repr__(self):
+        return "<PlannedTx {} {}>".format(self.fn_name, self.receiver)
+
+class PlannedContract:
+    def __init__(self, contract):
+        self._contract = contract
+
+    def __getattr__(self, name):
+        method = getattr(self._contract, name)
+
+        def encode(*args):
+            tx_params = {}
+            if args and isinstance(args[-1], dict):
+                tx_params = args[-1]
+                args = args[:-1]
+            return PlannedTx(self._contract.address, tx_params.get('value', 0), method.encode_input(*args), name, tx_params.get('from'))
+        return encode
+
+# Calls on plan(contract) return a PlannedTx with the calldata instead of
+# sending a transaction, e.g.
+#   txs.append(plan(vault_admin).depositToStrategy(strat, [WETH], [amount], std))
+def plan(contract):
+    return PlannedContract(contract)
+
+# Same as the TemporaryFork*Reallocations helpers for batches built with `plan`.
+# Nothing runs on a fork unless simulate=True, in which case the whole batch is
+# simulated once as a Safe MultiSend at the end.
+class PlanForReallocations:
+    def __init__(self, from_safe_address=STRATEGIST, chain="1", simulate=False):
+        self.from_safe_address = from_safe_address
+        self.chain = chain
+        self.simulate = simulate
+
+    def __enter__(self):
+        self.txs = []
+        return self.txs
+
+    def __exit__(self, *args, **kwargs):
+        print("----")
+        print("Gnosis json:")
+        print(to_gnosis_json(self.txs, self.from_safe_address, self.chain))
+        print("----")
+        if self.simulate:
+            show_multisend_gas(self.txs, self.from_safe_address, self.chain)
 
 def to_gnosis_json(txs, from_safe_address=STRATEGIST, chain="1"):
     main = {
@@ -133,3 +504,134 @@ def to_gnosis_json(txs, from_safe_address=STRATEGIST, chain="1"):
             }
         )
     return json.dumps(main)
+
+MULTISEND_SELECTOR = bytes.fromhex('8d80ff0a') # multiSend(bytes)
+# Keep every Safe transaction well under the block gas limit
+MULTISEND_MAX_BLOCK_FRACTION = 0.5
+
+# A simulated MultiSend batch or call reverted or ran out of gas
+class MultiSendSimulationFailed(Exception):
+    pass
+
+# Pack transactions into MultiSendCallOnly `multiSend(bytes)` calldata.
+# Each transaction is: operation (uint8, always call), to, value, data length, data
+def encode_multisend(txs):
+    packed = b''
+    for tx in txs:
+        data = bytes.fromhex(str(tx.input)[2:])
+        packed += encode_packed(
+            ['uint8', 'address', 'uint256', 'uint256', 'bytes'],
+            [0, tx.receiver, int(tx.value), len(data), data]
+        )
+    return '0x' + (MULTISEND_SELECTOR + abi.encode_abi(['bytes'], [packed])).hex()
+
+# Gas used by the Safe delegatecalling MultiSendCallOnly with the transactions.
+# Runs on the fork with the Safe's code swapped for MultiSendCallOnly's code, so
+# the batched calls come from the Safe as they would for real. The Safe's own
+# execTransaction overhead isn't included. State is reverted afterwards unless
+# revert=False, with a raw node snapshot so it can run inside a TemporaryFork.
+def simulate_multisend(txs, safe_address, revert=True):
+    web3 = brownie.network.web3
+    snapshot_id = evm_snapshot() if revert else None
+    try:
+        web3.provider.make_request('hardhat_setCode', [safe_address, web3.eth.get_code(MULTISEND_CALL_ONLY).hex()])
+        unlock(safe_address)
+        # Only adds gas money, batches moving ETH still see the Safe's balance
+        fund_eth(safe_address, hex(web3.eth.get_balance(safe_address) + 10**20))
+        block_gas_limit = web3.eth.get_block('latest')['gasLimit']
+        tx_hash = web3.eth.send_transaction({
+            'from': safe_address,
+            'to': safe_address,
+            'data': encode_multisend(txs),
+            'gas': block_gas_limit,
+        })
+        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+        if receipt['status'] != 1:
+            if receipt['gasUsed'] >= block_gas_limit:
+                raise MultiSendSimulationFailed("batch of {} ran out of gas at the block gas limit".format(len(txs)))
+            raise MultiSendSimulationFailed("batch of {} reverted".format(len(txs)))
+        return receipt['gasUsed']
+    finally:
+        if revert:
+            evm_revert(snapshot_id)
+
+# Gas of every transaction when the Safe sends them one after another, net of
+# the 21k base cost. Works for PlannedTx too, which never ran on their own.
+# State is reverted afterwards.
+def simulate_call_gas(txs, safe_address):
+    web3 = brownie.network.web3
+    snapshot_id = evm_snapshot()
+    try:
+        unlock(safe_address)
+        fund_eth(safe_address, hex(web3.eth.get_balance(safe_address) + 10**20))
+        block_gas_limit = web3.eth.get_block('latest')['gasLimit']
+        gas = []
+        for i, tx in enumerate(txs):
+            tx_hash = web3.eth.send_transaction({
+                'from': safe_address,
+                'to': tx.receiver,
+                'value': int(tx.value),
+                'data': str(tx.input),
+                'gas': block_gas_limit,
+            })
+            receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+            if receipt['status'] != 1:
+                raise MultiSendSimulationFailed("transaction {} ({}) reverted".format(i + 1, getattr(tx, 'fn_name', None) or tx.receiver))
+            gas.append(receipt['gasUsed'] - 21000)
+        return gas
+    finally:
+        evm_revert(snapshot_id)
+
+# Split transactions into MultiSend batches that each fit in `max_gas`, given
+# the gas of every transaction
+def split_multisend_batches(txs, gas, max_gas):
+    batches = [[]]
+    batch_gas = 0
+    for tx, tx_gas in zip(txs, gas):
+        if batches[-1] and batch_gas + tx_gas > max_gas:
+            batches.append([])
+            batch_gas = 0
+        batches[-1].append(tx)
+        batch_gas += tx_gas
+    return batches
+
+# Measure the gas of executing the transactions as Safe MultiSend batches,
+# splitting them when a single batch would be too close to the block gas limit,
+# or doesn't run at all as one batch (e.g. out of gas at the block gas limit).
+# Returns a list of (transactions, gas used) per batch.
+def multisend_batches(txs, safe_address):
+    max_gas = int(brownie.network.web3.eth.get_block('latest')['gasLimit'] * MULTISEND_MAX_BLOCK_FRACTION)
+    try:
+        gas = simulate_multisend(txs, safe_address)
+        if gas <= max_gas or len(txs) == 1:
+            return [(txs, gas)]
+        print("WARNING: batch uses {:,} gas, over {:,}. Splitting it".format(gas, max_gas))
+    except MultiSendSimulationFailed as e:
+        if len(txs) == 1:
+            raise
+        print("WARNING: {}. Splitting it by the gas of each transaction".format(e))
+    batches = split_multisend_batches(txs, simulate_call_gas(txs, safe_address), max_gas)
+    # Each batch runs on top of the ones before it, as it would on chain
+    snapshot_id = evm_snapshot()
+    try:
+        return [(batch, simulate_multisend(batch, safe_address, revert=False)) for batch in batches]
+    finally:
+        evm_revert(snapshot_id)
+
+def show_multisend_gas(txs, safe_address, chain="1"):
+    if len(txs) == 0:
+        return
+    try:
+        batches = multisend_batches(txs, safe_address)
+    except MultiSendSimulationFailed as e:
+        print("MultiSend simulation failed: {}".format(e))
+        if all([x.gas_used for x in txs]):
+            print("Est Gas Max (sum of gas used): {:,}".format(int(1.10 * sum([x.gas_used for x in txs]))))
+        else:
+            print("Est Gas Max: unavailable, planned transactions never ran on their own")
+        return
+
+    for i, (batch, gas) in enumerate(batches):
+        print("MultiSend batch {} of {}: {} transactions, {:,} gas".format(i + 1, len(batches), len(batch), gas))
+        if len(batches) > 1:
+            print(to_gnosis_json(batch, safe_address, chain))
@@ -101,22 +101,21 @@ def amo_snapshot():
     totalTickTokens = wethInTickTotal + oethbInTickTotal
 
     print("------------------ AMO Strategy LP position ------------------")
-    print("           ", leading_whitespace("Amount"), leading_whitespace("Percentage"))
-    if stratTotal > 0:  
-      print("WETH       ", c18(wethOwned), pcts(wethOwned * 100 / stratTotal))
-      print("superOETH  ", c18(oethbOwned), pcts(oethbOwned * 100 / stratTotal))
-      print("Total      ", c18(stratTotal), pcts(100))
-    if totalTickTokens > 0:
-      print("Dominance  ", pcts(stratTotal / totalTickTokens * 100))
-    else:
-      print("Dominance  ", pcts(0))
+    if stratTotal > 0:
+      print(render_table(["", "Amount", "Percentage"], [
+        ["WETH", amount_string(wethOwned), pcts(wethOwned * 100 / stratTotal).strip()],
+        ["superOETH", amount_string(oethbOwned), pcts(oethbOwned * 100 / stratTotal).strip()],
+        ["Total", amount_string(stratTotal), pcts(100).strip()],
+      ]))
+    print("Dominance  ", pcts(stratTotal / totalTickTokens * 100 if totalTickTokens > 0 else 0))
 
 
     print("------------------ Others LP position ------------------------")
-    print("           ", leading_whitespace("Amount"))
-    print("WETH       ", c18(nonStratWeth))
-    print("superOETH  ", c18(nonStratOethb))
-    print("Total      ", c18(othersTotal), pcts(100))
+    print(render_table(["", "Amount"], [
+      ["WETH", amount_string(nonStratWeth)],
+      ["superOETH", amount_string(nonStratOethb)],
+      ["Total", amount_string(othersTotal)],
+    ]))
 
     # Maybe un-comment if you deem it useful    
     # print("--------------------- Pool stats -----------------------------")